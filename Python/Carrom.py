@@ -1,16 +1,27 @@
 import pygame
+import os
 import sys
 import math
 import random
+import time
 
-# Initialize pygame
-pygame.init()
+from carrom_engine import Body, StrikerBody, BoardState, FixedTimestep, ShotHistory, QUEEN, BLACK, WHITE
+from carrom_ai import ShotPlanner, simple_position, simple_aim
+from carrom_replay import ReplayRecorder
+from carrom_preview import AimPreview
+from text_cache import render_text
+from font_cache import load_font
+from dirty_rects import DirtyRects
+from frame_profiler import FrameProfiler
 
-# Set up the display
+# Set up the display; main() opens the window, so importing this module
+# only defines the game
 width = 600
 height = 600
-window = pygame.display.set_mode((width, height))
-pygame.display.set_caption("Carrom Game")
+window = None
+
+# Opt-in with --dirty-rects: present only the parts of the window that changed
+dirty_rects = DirtyRects()
 
 # Colors
 white = (255, 255, 255)
@@ -26,10 +37,11 @@ cream = (255, 253, 208)
 yellow = (255, 255, 0)
 pink = (255, 192, 203)
 
-# Fonts
-title_font = pygame.font.SysFont(Arial, 64)
-button_font = pygame.font.SysFont(Arial, 32)
-score_font = pygame.font.SysFont(Arial, 24)
+# Fonts, loaded by load_fonts() once pygame is initialized
+title_font = None
+button_font = None
+score_font = None
+hud_font = None
 
 # Game states
 WELCOME_SCREEN = 0
@@ -38,9 +50,6 @@ VS_FRIEND = 2
 VS_COMPUTER = 3
 GAME_OVER = 4
 
-# Current game state
-game_state = WELCOME_SCREEN
-
 # Button class for interactive buttons
 class Button:
     def __init__(self, x, y, width, height, text, color, hover_color):
@@ -55,7 +64,7 @@ class Button:
         pygame.draw.rect(surface, color, self.rect, border_radius=10)
         pygame.draw.rect(surface, black, self.rect, 2, border_radius=10)
         
-        text_surface = button_font.render(self.text, True, black)
+        text_surface = render_text(button_font, self.text, black)
         text_rect = text_surface.get_rect(center=self.rect.center)
         surface.blit(text_surface, text_rect)
         
@@ -70,165 +79,159 @@ class Button:
 vs_friend_button = Button(width//2 - 150, height//2 - 40, 300, 60, "vs Friend", lightbrown, beige)
 vs_computer_button = Button(width//2 - 150, height//2 + 40, 300, 60, "vs Computer", lightbrown, beige)
 instructions_button = Button(width//2 - 150, height//2 + 120, 300, 60, "Instructions", lightbrown, beige)
+play_again_button = Button(width//2 - 150, height//2 + 120, 300, 60, "Play Again", lightbrown, beige)
+
+# A screen that stays the same while it is shown: everything but its
+# buttons is composed once into a layer, and a button is only redrawn when
+# the mouse moves onto or off it
+class MenuScreen:
+    def __init__(self, layer, buttons=(), areas=()):
+        self.layer = layer
+        self.buttons = list(buttons)  # (name, Button)
+        self.areas = list(areas)  # (name, Rect) clickable parts of the layer
+        
+    def draw(self, surface, mouse_pos, dirty):
+        """Repaint the screen after dirty.invalidate(), otherwise only hover changes."""
+        full = dirty.full
+        if full:
+            surface.blit(self.layer, (0, 0))
+        for name, button in self.buttons:
+            hovered = button.is_hovered
+            if button.check_hover(mouse_pos) != hovered or full:
+                if not full:
+                    surface.blit(self.layer, button.rect, button.rect)
+                    dirty.add(button.rect)
+                button.draw(surface)
+        
+    def clicked(self, pos, click):
+        """Name of the button or area clicked this frame, or None."""
+        if click:
+            for name, button in self.buttons:
+                if button.is_clicked(pos, click):
+                    return name
+            for name, rect in self.areas:
+                if rect.collidepoint(pos):
+                    return name
+        return None
+
+# Pre-rendered pieces, keyed on everything that changes how they look
+sprite_cache = {}
+
+def circle_sprite(key, fill, radius, outline, outline_width, inner=None):
+    sprite = sprite_cache.get(key)
+    if sprite is None:
+        size = radius * 2 + 1
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        center = (radius, radius)
+        pygame.draw.circle(sprite, fill, center, radius)
+        if inner is not None:
+            pygame.draw.circle(sprite, inner, center, radius - 5)
+        else:
+            pygame.draw.circle(sprite, outline, center, radius, outline_width)
+        sprite = sprite.convert_alpha()
+        sprite_cache[key] = sprite
+    return sprite
+
+def coin_sprite(color, radius, is_queen):
+    if is_queen:
+        return circle_sprite(("queen", color, radius), color, radius, None, 0, inner=red)
+    return circle_sprite(("coin", color, radius), color, radius, black, 1)
+
+def striker_sprite(radius, valid):
+    if valid:
+        return circle_sprite(("striker", radius, True), white, radius, black, 2)
+    # Red tint for invalid position
+    return circle_sprite(("striker", radius, False), (255, 200, 200), radius, red, 2)
 
 # Coin class for carrom men
-class Coin:
+class Coin(Body):
     def __init__(self, x, y, color, radius=15, is_queen=False):
-        self.x = x
-        self.y = y
+        if is_queen:
+            kind = QUEEN
+        elif color == white:
+            kind = WHITE
+        else:
+            kind = BLACK
+        super().__init__(x, y, radius, kind)
         self.color = color
-        self.radius = radius
-        self.is_queen = is_queen
-        self.velocity_x = 0
-        self.velocity_y = 0
-        self.friction = 0.98
-        self.pocketed = False
         
     def draw(self, surface):
         if not self.pocketed:
-            pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-            if self.is_queen:
-                pygame.draw.circle(surface, red, (int(self.x), int(self.y)), self.radius - 5)
-            else:
-                pygame.draw.circle(surface, black, (int(self.x), int(self.y)), self.radius, 1)
-                
-    def update(self):
-        if not self.pocketed:
-            self.x += self.velocity_x
-            self.y += self.velocity_y
-            
-            # Apply friction
-            self.velocity_x *= self.friction
-            self.velocity_y *= self.friction
-            
-            # Stop if velocity is very small
-            if abs(self.velocity_x) < 0.1 and abs(self.velocity_y) < 0.1:
-                self.velocity_x = 0
-                self.velocity_y = 0
+            sprite = coin_sprite(self.color, self.radius, self.is_queen)
+            surface.blit(sprite, (int(self.x) - self.radius, int(self.y) - self.radius))
+    
+    def bounds(self):
+        size = self.radius * 2 + 1
+        return pygame.Rect(int(self.x) - self.radius, int(self.y) - self.radius, size, size)
 
 # Striker class
-class Striker(Coin):
-    def __init__(self, x, y):
-        super().__init__(x, y, white, radius=20)
-        self.is_selected = False
-        self.power = 0
-        self.max_power = 30  # Increased max power
-        self.angle = 0
-        self.valid_position = True  # Flag to indicate if position is valid
-        
+class Striker(StrikerBody):
     def draw(self, surface):
         if not self.pocketed:
             # Draw the striker with color based on position validity
-            if self.valid_position:
-                pygame.draw.circle(surface, white, (int(self.x), int(self.y)), self.radius)
-                pygame.draw.circle(surface, black, (int(self.x), int(self.y)), self.radius, 2)
-            else:
-                # Red tint for invalid position
-                pygame.draw.circle(surface, (255, 200, 200), (int(self.x), int(self.y)), self.radius)
-                pygame.draw.circle(surface, red, (int(self.x), int(self.y)), self.radius, 2)
+            sprite = striker_sprite(self.radius, self.valid_position)
+            surface.blit(sprite, (int(self.x) - self.radius, int(self.y) - self.radius))
             
             # Draw power indicator when selected
             if self.is_selected and self.power > 0:
                 end_x = self.x + math.cos(self.angle) * self.power * 5
                 end_y = self.y + math.sin(self.angle) * self.power * 5
                 pygame.draw.line(surface, red, (self.x, self.y), (end_x, end_y), 2)
-                
-    def position_on_baseline(self, board, mouse_x, player_turn=0):
-        # Position based on player turn (0 for bottom, 1 for top)
-        if player_turn == 0:  # Player 1 (bottom)
-            baseline_y = board.board_y + board.board_size - 50
-        else:  # Player 2 (top)
-            baseline_y = board.board_y + 50
-        
-        # Calculate bounds for striker movement
-        left_bound = board.board_x + 50
-        right_bound = board.board_x + board.board_size - 50
-        
-        # Clamp the x position to the bounds
-        new_x = max(left_bound, min(mouse_x, right_bound))
-        
-        # Store original position to restore if new position overlaps with coins
-        original_x, original_y = self.x, self.y
-        
-        # Try the new position
-        self.x = new_x
-        self.y = baseline_y
-        
-        # Check if this position overlaps with any coins
-        if board.striker_overlaps_coins():
-            # Mark position as invalid but don't restore original position
-            # This allows visual feedback while still showing where the mouse is
-            self.valid_position = False
-        else:
-            self.valid_position = True
-        
-    def aim(self, mouse_pos):
-        # Calculate angle between striker and mouse position
-        dx = mouse_pos[0] - self.x
-        dy = mouse_pos[1] - self.y
-        self.angle = math.atan2(dy, dx)
-        
-        # Calculate power based on distance (capped at max_power)
-        distance = math.sqrt(dx**2 + dy**2)
-        self.power = min(distance / 15, self.max_power)  # Increased power factor
-        
-    def shoot(self):
-        # Apply velocity based on power and angle with a power multiplier
-        power_multiplier = 1.5  # Increase the power
-        self.velocity_x = math.cos(self.angle) * self.power * power_multiplier
-        self.velocity_y = math.sin(self.angle) * self.power * power_multiplier
-        self.power = 0
-        self.is_selected = False
-
-# Carrom board class
-class CarromBoard:
+    
+    def bounds(self):
+        size = self.radius * 2 + 1
+        rect = pygame.Rect(int(self.x) - self.radius, int(self.y) - self.radius, size, size)
+        if self.is_selected and self.power > 0:
+            end_x = self.x + math.cos(self.angle) * self.power * 5
+            end_y = self.y + math.sin(self.angle) * self.power * 5
+            # Padded to cover the line's width and rounding
+            line = pygame.Rect(int(min(self.x, end_x)) - 3, int(min(self.y, end_y)) - 3,
+                               int(abs(end_x - self.x)) + 7, int(abs(end_y - self.y)) + 7)
+            rect = rect.union(line)
+        return rect
+
+# Static board layers, keyed on board geometry
+board_layers = {}
+
+# Carrom board class: physics and rules live in carrom_engine.BoardState
+class CarromBoard(BoardState):
     def __init__(self):
-        self.board_size = min(width, height) - 100
-        self.board_x = (width - self.board_size) // 2
-        self.board_y = (height - self.board_size) // 2
-        self.hole_radius = self.board_size // 20
-        self.coins = []
-        self.striker = Striker(width // 2, self.board_y + self.board_size - 50)
-        self.setup_coins()
-        self.turn = 0  # 0 for player 1, 1 for player 2
-        self.scores = [0, 0]
-        self.game_phase = "positioning"  # positioning, aiming, shooting, waiting
-        
-    def setup_coins(self):
-        # Clear existing coins
-        self.coins = []
-        
-        # Center of the board
-        center_x = self.board_x + self.board_size // 2
-        center_y = self.board_y + self.board_size // 2
-        
-        # Queen (red coin) at the center
-        self.coins.append(Coin(center_x, center_y, red, is_queen=True))
-        
-        # Arrange other coins in a circle around the queen
-        coin_radius = 15
-        arrangement_radius = 40
+        super().__init__(width, height)
+        self.preview = None  # carrom_preview.AimPreview while aiming, if enabled
+        self.history = None  # ShotHistory of shots that can be taken back
+        
+    def copy(self):
+        board = super().copy()
+        board.preview = None  # headless copies never draw
+        board.history = None
+        return board
+    
+    def shoot(self):
+        if self.history is not None:
+            self.history.push(self)
+        super().shoot()
+    
+    def undo_shot(self):
+        """Take back the last shot; its player then places the striker again."""
+        if self.history is None or not self.history.undo(self):
+            return False
+        self.game_phase = "positioning"
+        if self.preview is not None:
+            self.preview.clear()
+        return True
+        
+    def make_coin(self, x, y, kind, radius=15):
+        if kind == QUEEN:
+            return Coin(x, y, red, radius, is_queen=True)
+        return Coin(x, y, white if kind == WHITE else black, radius)
+    
+    def make_striker(self, x, y):
+        return Striker(x, y)
         
-        # Black coins
-        for i in range(9):
-            angle = 2 * math.pi * i / 9
-            x = center_x + math.cos(angle) * arrangement_radius
-            y = center_y + math.sin(angle) * arrangement_radius
-            self.coins.append(Coin(x, y, black))
-            
-        # White coins
-        arrangement_radius = 70
-        for i in range(9):
-            angle = 2 * math.pi * i / 9 + math.pi/9  # Offset to stagger
-            x = center_x + math.cos(angle) * arrangement_radius
-            y = center_y + math.sin(angle) * arrangement_radius
-            self.coins.append(Coin(x, y, white))
-            
-        # Reset striker - Player 1 starts at the bottom
-        self.striker = Striker(width // 2, 0)  # Y will be set by position_on_baseline
-        self.striker.position_on_baseline(self, width // 2, 0)  # 0 for bottom position (Player 1)
+    def draw_static(self, surface):
+        """Draw everything on the board that does not move."""
+        surface.fill(white)
         
-    def draw(self, surface):
         # Draw the outer board (frame)
         pygame.draw.rect(surface, darkbrown, 
                          (self.board_x - 30, self.board_y - 30, 
@@ -313,320 +316,149 @@ class CarromBoard:
         pygame.draw.circle(surface, black, (self.board_x + self.board_size - 50, top_baseline_y), 5)
         
         # Draw player indicators
-        p1_text = score_font.render("P1", True, black)
-        p2_text = score_font.render("P2", True, black)
+        p1_text = render_text(score_font, "P1", black)
+        p2_text = render_text(score_font, "P2", black)
         surface.blit(p1_text, (self.board_x + self.board_size // 2 - 15, bottom_baseline_y + 15))
         surface.blit(p2_text, (self.board_x + self.board_size // 2 - 15, top_baseline_y - 30))
         
-        # Draw coins
-        for coin in self.coins:
-            coin.draw(surface)
-            
-        # Draw striker
-        self.striker.draw(surface)
-        
-        # Draw scores and turn indicator
-        player1_text = f"Player 1: {self.scores[0]}"
-        player2_text = f"Player 2: {self.scores[1]}"
-        
-        player1_surface = score_font.render(player1_text, True, black)
-        player2_surface = score_font.render(player2_text, True, black)
-        
-        surface.blit(player1_surface, (self.board_x, self.board_y - 30))
-        surface.blit(player2_surface, (self.board_x + self.board_size - 150, self.board_y - 30))
-        
-        # Turn indicator
-        turn_text = f"Player {self.turn + 1}'s Turn"
-        turn_surface = score_font.render(turn_text, True, black)
-        surface.blit(turn_surface, (width // 2 - 60, self.board_y - 30))
-        
-        # Game phase indicator
-        phase_text = f"Phase: {self.game_phase.capitalize()}"
-        phase_surface = score_font.render(phase_text, True, black)
-        surface.blit(phase_surface, (width // 2 - 60, height - 30))
-        
-    def update(self):
-        # Only update coins and check collisions when not in positioning phase
-        if self.game_phase == "positioning":
-            # In positioning phase, only check if striker overlaps with coins
-            # but don't update coins or check for collisions
-            pass
-        else:
-            # Update striker
-            self.striker.update()
-            
-            # Update all coins
-            for coin in self.coins:
-                coin.update()
-                
-            # Check for collisions
-            self.check_collisions()
-        
-        # Check if all pieces have stopped moving
-        all_stopped = (self.striker.velocity_x == 0 and self.striker.velocity_y == 0)
-        for coin in self.coins:
-            if not coin.pocketed and (coin.velocity_x != 0 or coin.velocity_y != 0):
-                all_stopped = False
-                break
-                
-        # If all pieces have stopped after shooting, switch to positioning phase
-        if all_stopped and self.game_phase == "waiting":
-            # Switch turns
-            self.turn = 1 - self.turn
-            self.game_phase = "positioning"
-            
-            # Reset striker if it was pocketed
-            if self.striker.pocketed:
-                # Create new striker at the appropriate position based on whose turn it is
-                self.striker = Striker(width // 2, 0)  # Y will be set by position_on_baseline
-                self.striker.position_on_baseline(self, width // 2, self.turn)
-            else:
-                # Make sure striker velocity is reset
-                self.striker.velocity_x = 0
-                self.striker.velocity_y = 0
-                
-    def striker_overlaps_coins(self):
-        """Check if the striker overlaps with any coins on the board."""
-        if self.striker.pocketed:
-            return False
-            
-        for coin in self.coins:
-            if not coin.pocketed:
-                # Calculate distance between striker and coin centers
-                distance = math.sqrt((self.striker.x - coin.x)**2 + (self.striker.y - coin.y)**2)
-                # Check if they overlap
-                if distance < (self.striker.radius + coin.radius):
-                    return True
-        return False
-        
-    def check_winner(self):
-        # Check if any player has reached 21 points or more
-        if self.scores[0] >= 21:
-            return 1  # Player 1 wins
-        elif self.scores[1] >= 21:
-            return 2  # Player 2 wins
-            
-        # Check if all coins are pocketed
-        all_pocketed = True
-        for coin in self.coins:
-            if not coin.pocketed:
-                all_pocketed = False
-                break
-                
-        if all_pocketed:
-            # Determine winner based on score
-            if self.scores[0] > self.scores[1]:
-                return 1  # Player 1 wins
-            elif self.scores[1] > self.scores[0]:
-                return 2  # Player 2 wins
-            else:
-                return 3  # Tie
-                
-        return 0  # No winner yet
-                
-    def check_collisions(self):
-        # Check for coin-coin collisions
-        for i in range(len(self.coins)):
-            if self.coins[i].pocketed:
-                continue
-                
-            # Check collision with striker
-            if not self.striker.pocketed:
-                self.handle_collision(self.striker, self.coins[i])
-                
-            # Check collision with other coins
-            for j in range(i + 1, len(self.coins)):
-                if not self.coins[j].pocketed:
-                    self.handle_collision(self.coins[i], self.coins[j])
-                    
-        # Check for wall collisions
-        self.check_wall_collisions()
-        
-        # Check for pocket collisions
-        self.check_pocket_collisions()
-        
-    def handle_collision(self, coin1, coin2):
-        # Calculate distance between centers
-        dx = coin2.x - coin1.x
-        dy = coin2.y - coin1.y
-        distance = math.sqrt(dx**2 + dy**2)
-        
-        # Check if coins are colliding
-        if distance < coin1.radius + coin2.radius:
-            # Calculate collision normal
-            if distance == 0:  # Avoid division by zero
-                nx, ny = 1, 0
-            else:
-                nx, ny = dx/distance, dy/distance
-                
-            # Calculate relative velocity
-            dvx = coin2.velocity_x - coin1.velocity_x
-            dvy = coin2.velocity_y - coin1.velocity_y
-            
-            # Calculate velocity along normal
-            velocity_normal = dvx * nx + dvy * ny
-            
-            # If coins are moving away from each other, no collision response
-            if velocity_normal > 0:
-                return
-                
-            # Calculate impulse
-            impulse = 2 * velocity_normal / 2  # Assuming equal mass
-            
-            # Apply impulse
-            coin1.velocity_x += impulse * nx
-            coin1.velocity_y += impulse * ny
-            coin2.velocity_x -= impulse * nx
-            coin2.velocity_y -= impulse * ny
-            
-            # Separate coins to avoid sticking
-            overlap = (coin1.radius + coin2.radius - distance) / 2
-            coin1.x -= overlap * nx
-            coin1.y -= overlap * ny
-            coin2.x += overlap * nx
-            coin2.y += overlap * ny
-            
-    def check_wall_collisions(self):
-        # Check striker wall collisions
-        if not self.striker.pocketed:
-            if self.striker.x - self.striker.radius < self.board_x:
-                self.striker.x = self.board_x + self.striker.radius
-                self.striker.velocity_x = -self.striker.velocity_x * 0.8
-            elif self.striker.x + self.striker.radius > self.board_x + self.board_size:
-                self.striker.x = self.board_x + self.board_size - self.striker.radius
-                self.striker.velocity_x = -self.striker.velocity_x * 0.8
-                
-            if self.striker.y - self.striker.radius < self.board_y:
-                self.striker.y = self.board_y + self.striker.radius
-                self.striker.velocity_y = -self.striker.velocity_y * 0.8
-            elif self.striker.y + self.striker.radius > self.board_y + self.board_size:
-                self.striker.y = self.board_y + self.board_size - self.striker.radius
-                self.striker.velocity_y = -self.striker.velocity_y * 0.8
-                
-        # Check coin wall collisions
+    def static_layer(self):
+        # The bare board is drawn once per geometry and blitted every frame
+        key = (width, height, self.board_x, self.board_y, self.board_size, self.hole_radius)
+        layer = board_layers.get(key)
+        if layer is None:
+            layer = pygame.Surface((width, height))
+            self.draw_static(layer)
+            layer = layer.convert()
+            board_layers[key] = layer
+        return layer
+        
+    def draw_items(self):
+        """Everything drawn over the static layer, in drawing order.
+        
+        Each item is (key, rect, state, draw); state is anything besides the
+        rect that changes how the item looks.
+        """
+        items = []
+        
+        # Coins and striker
         for coin in self.coins:
             if not coin.pocketed:
-                if coin.x - coin.radius < self.board_x:
-                    coin.x = self.board_x + coin.radius
-                    coin.velocity_x = -coin.velocity_x * 0.8
-                elif coin.x + coin.radius > self.board_x + self.board_size:
-                    coin.x = self.board_x + self.board_size - coin.radius
-                    coin.velocity_x = -coin.velocity_x * 0.8
-                    
-                if coin.y - coin.radius < self.board_y:
-                    coin.y = self.board_y + coin.radius
-                    coin.velocity_y = -coin.velocity_y * 0.8
-                elif coin.y + coin.radius > self.board_y + self.board_size:
-                    coin.y = self.board_y + self.board_size - coin.radius
-                    coin.velocity_y = -coin.velocity_y * 0.8
-                    
-    def check_pocket_collisions(self):
-        # Define pocket positions
-        pockets = [
-            (self.board_x, self.board_y),  # Top-left
-            (self.board_x + self.board_size, self.board_y),  # Top-right
-            (self.board_x, self.board_y + self.board_size),  # Bottom-left
-            (self.board_x + self.board_size, self.board_y + self.board_size)  # Bottom-right
+                items.append((id(coin), coin.bounds(), None, coin.draw))
+        striker = self.striker
+        if self.preview is not None and self.preview.current is not None and self.game_phase == "aiming":
+            items.append(self.preview_item(self.preview.current))
+        if not striker.pocketed:
+            state = (striker.valid_position, striker.is_selected, striker.power, striker.angle)
+            items.append((id(striker), striker.bounds(), state, striker.draw))
+        
+        # Scores, turn indicator and game phase
+        texts = [
+            (f"Player 1: {self.scores[0]}", (self.board_x, self.board_y - 30)),
+            (f"Player 2: {self.scores[1]}", (self.board_x + self.board_size - 150, self.board_y - 30)),
+            (f"Player {self.turn + 1}'s Turn", (width // 2 - 60, self.board_y - 30)),
+            (f"Phase: {self.game_phase.capitalize()}", (width // 2 - 60, height - 30)),
         ]
-        
-        # Check striker
-        if not self.striker.pocketed:
-            for pocket in pockets:
-                distance = math.sqrt((self.striker.x - pocket[0])**2 + (self.striker.y - pocket[1])**2)
-                if distance < self.hole_radius:
-                    self.striker.pocketed = True
-                    self.striker.velocity_x = 0
-                    self.striker.velocity_y = 0
-                    break
-                    
-        # Check coins
-        for coin in self.coins:
-            if not coin.pocketed:
-                for pocket in pockets:
-                    distance = math.sqrt((coin.x - pocket[0])**2 + (coin.y - pocket[1])**2)
-                    if distance < self.hole_radius:
-                        coin.pocketed = True
-                        coin.velocity_x = 0
-                        coin.velocity_y = 0
-                        
-                        # Award points
-                        if coin.is_queen:
-                            self.scores[self.turn] += 5
-                        elif coin.color == black:
-                            self.scores[self.turn] += 1
-                        elif coin.color == white:
-                            self.scores[self.turn] += 2
-                        break
-                        
-    def handle_input(self, mouse_pos, mouse_clicked, is_computer_turn=False):
+        for i, (text, position) in enumerate(texts):
+            text_surface = render_text(score_font, text, black)
+            def draw_text(surface, text_surface=text_surface, position=position):
+                surface.blit(text_surface, position)
+            items.append((("text", i), text_surface.get_rect(topleft=position), text, draw_text))
+        return items
+        
+    def preview_item(self, trajectory):
+        """Draw item for the predicted striker path and the first coin it hits."""
+        points = [(int(x), int(y)) for x, y in trajectory.points]
+        xs = [x for x, y in points]
+        ys = [y for x, y in points]
+        rect = pygame.Rect(min(xs) - 2, min(ys) - 2, max(xs) - min(xs) + 5, max(ys) - min(ys) + 5)
+        hit = trajectory.hit
+        radius = self.striker.radius
+        if hit is not None:
+            # Ghost striker where it meets the coin, and a ring round the coin
+            end_x, end_y = points[-1]
+            rect.union_ip((end_x - radius, end_y - radius, 2 * radius + 1, 2 * radius + 1))
+            rect.union_ip((int(hit.x) - hit.radius - 4, int(hit.y) - hit.radius - 4,
+                           2 * hit.radius + 9, 2 * hit.radius + 9))
+        
+        def draw_preview(surface):
+            if len(points) > 1:
+                pygame.draw.lines(surface, blue, False, points, 1)
+            if hit is not None:
+                pygame.draw.circle(surface, blue, points[-1], radius, 1)
+                pygame.draw.circle(surface, red, (int(hit.x), int(hit.y)), hit.radius + 3, 2)
+        state = (id(trajectory), len(points), hit is not None)
+        return ("preview", rect, state, draw_preview)
+        
+    def draw(self, surface, dirty=None):
+        layer = self.static_layer()
+        items = self.draw_items()
+        
+        if dirty is None or not dirty.partial:
+            surface.blit(layer, (0, 0))
+            for key, rect, state, draw in items:
+                draw(surface)
+                if dirty is not None:
+                    dirty.changed(key, rect, state)
+            return
+        
+        # Only touch the areas of items that moved, changed or vanished
+        for key, rect, state, draw in items:
+            dirty.changed(key, rect, state)
+        rects = dirty.collect()
+        if not rects:
+            return
+        for rect in rects:
+            surface.blit(layer, rect, rect)
+        
+        # Redraw, in order, whatever overlaps a restored area or an item
+        # redrawn before it
+        touched = list(rects)
+        for key, rect, state, draw in items:
+            if rect.collidelist(touched) != -1:
+                draw(surface)
+                touched.append(rect)
+        
+    def handle_input(self, mouse_pos, mouse_clicked, is_computer_turn=False, planner=None):
         if is_computer_turn:
+            # Stronger AI: the Monte Carlo planner thinks across frames and
+            # shoots once it has picked a shot
+            if planner is not None and self.game_phase == "positioning":
+                if planner.busy or planner.start(self):
+                    shot = planner.poll()
+                    if shot is not None:
+                        self.take_shot(*shot)
+                    return
+            
             # Computer AI logic
             if self.game_phase == "positioning":
-                # Position the striker randomly along the baseline based on turn
-                left_bound = self.board_x + 50
-                right_bound = self.board_x + self.board_size - 50
-                
-                # Try to find a position that doesn't overlap with coins
-                max_attempts = 20
-                attempts = 0
-                valid_position_found = False
-                
-                while attempts < max_attempts and not valid_position_found:
-                    # Random position with some strategy
-                    self.striker.x = random.uniform(left_bound, right_bound)
-                    # Position based on turn (Player 2/Computer is at the top)
-                    self.striker.position_on_baseline(self, self.striker.x, 1)  # 1 for top position
-                    
-                    # Check if this position is valid (doesn't overlap with coins)
-                    if not self.striker_overlaps_coins():
-                        valid_position_found = True
-                    
-                    attempts += 1
+                # Position the striker randomly along the baseline, avoiding coins
+                simple_position(self)
                 
                 # Move to aiming phase
                 self.game_phase = "aiming"
                 self.striker.is_selected = True
                 
             elif self.game_phase == "aiming":
-                # Find a target (prioritize queen, then closest coin)
-                target_x, target_y = self.board_x + self.board_size // 2, self.board_y + self.board_size // 2
-                
-                # Look for non-pocketed coins
-                available_coins = [coin for coin in self.coins if not coin.pocketed]
-                
-                if available_coins:
-                    # Prioritize the queen if it's still on the board
-                    queen_coins = [coin for coin in available_coins if coin.is_queen]
-                    if queen_coins:
-                        target = queen_coins[0]
-                    else:
-                        # Otherwise aim for a random coin
-                        target = random.choice(available_coins)
-                    
-                    target_x, target_y = target.x, target.y
-                
-                # Calculate angle and add some randomness for imperfect AI
-                dx = target_x - self.striker.x
-                dy = target_y - self.striker.y
-                angle = math.atan2(dy, dx)
-                
-                # Add some randomness to the angle
-                angle += random.uniform(-0.2, 0.2)
-                
-                # Set the striker's angle and power
-                self.striker.angle = angle
-                self.striker.power = random.uniform(10, 20)  # Increased random power
+                # Aim at the queen or a random coin, with some randomness
+                self.striker.angle, self.striker.power = simple_aim(self)
                 
                 # Shoot after a short delay
-                self.striker.shoot()
-                self.game_phase = "waiting"
+                self.shoot()
         else:
             # Human player input
             if self.game_phase == "positioning":
                 # Position the striker on the baseline based on turn
                 self.striker.position_on_baseline(self, mouse_pos[0], self.turn)
+                if self.preview is not None:
+                    self.preview.clear()
+                
+                # A click on a spot overlapping a coin snaps the striker to
+                # the nearest free spot, if there is one
+                if mouse_clicked and not self.striker.valid_position:
+                    x = self.free_baseline(self.turn).nearest(self.striker.x)
+                    if x is not None:
+                        self.striker.position_on_baseline(self, x, self.turn)
                 
-                # Only allow clicking if the striker position is valid (not overlapping with coins)
                 if mouse_clicked and self.striker.valid_position:
                     self.game_phase = "aiming"
                     self.striker.is_selected = True
@@ -634,236 +466,466 @@ class CarromBoard:
             elif self.game_phase == "aiming":
                 # Aim the striker
                 self.striker.aim(mouse_pos)
+                if self.preview is not None:
+                    self.preview.update(self)
                 
                 if mouse_clicked:
-                    self.striker.shoot()
-                    self.game_phase = "waiting"
+                    self.shoot()
+
+# Monte Carlo computer opponent; set to None for the simple random AI
+computer_planner = ShotPlanner()
+
+# Physics steps per second, independent of the 60 FPS drawing; pass
+# --physics-hz=120 or 240 for more accurate collisions at more CPU cost
+physics_rate = 60
+# Save every finished match as a replay in this directory with
+# --replay-dir=PATH; check them later with carrom_replay.py
+replay_dir = None
+# Show where the striker will go while aiming with --aim-preview
+aim_preview = False
+# Frame timings are written here on exit with --profile-out=PATH (.csv or .json)
+profile_path = None
+# Network play: --host=[ADDRESS:]PORT waits for a friend who starts with
+# --join=ADDRESS:PORT, and "vs Friend" is then played across the network
+net_connection = None
+net_player = 0  # 0 hosts and plays from the bottom, 1 joins
+# Spectators can watch every match with carrom_broadcast.py watch when the
+# game is started with --broadcast=[ADDRESS:]PORT
+broadcaster = None
+replay_recorder = None
+net_session = None  # the networked match, one per connection
+
+# Time spent in each phase of the last 600 frames; F3 shows the percentiles
+profiler = FrameProfiler(600)
+hud_surface = None
+# Screens timed as a whole rather than phase by phase
+screen_phases = {WELCOME_SCREEN: "menu", INSTRUCTIONS: "menu", GAME_OVER: "game over"}
+
+
+def parse_args(argv):
+    """Apply the command line flags to the settings above."""
+    global physics_rate, replay_dir, aim_preview, profile_path, net_connection, net_player, broadcaster
+    dirty_rects.enabled = "--dirty-rects" in argv
+    aim_preview = "--aim-preview" in argv
+    # The networking modules pull in asyncio, so only load them when asked for
+    if any(arg.startswith(("--host=", "--join=", "--broadcast=")) for arg in argv):
+        from carrom_net import Connection, parse_address
+        from carrom_broadcast import Broadcaster
+    for arg in argv:
+        if arg.startswith("--physics-hz="):
+            physics_rate = int(arg[len("--physics-hz="):])
+        elif arg.startswith("--replay-dir="):
+            replay_dir = arg[len("--replay-dir="):]
+        elif arg.startswith("--profile-out="):
+            profile_path = arg[len("--profile-out="):]
+        elif arg.startswith("--host="):
+            address, port = parse_address(arg[len("--host="):])
+            net_connection = Connection.host(port, address)
+        elif arg.startswith("--join="):
+            address, port = parse_address(arg[len("--join="):])
+            net_connection = Connection.join(address, port)
+            net_player = 1
+        elif arg.startswith("--broadcast="):
+            address, port = parse_address(arg[len("--broadcast="):])
+            broadcaster = Broadcaster(address, port)
+            broadcaster.start_thread()
+
+
+def load_fonts():
+    """Load the fonts, finding Arial's file through the on-disk font cache."""
+    global title_font, button_font, score_font, hud_font
+    title_font = load_font("arial", 64)
+    button_font = load_font("arial", 32)
+    score_font = load_font("arial", 24)
+    hud_font = pygame.font.Font(None, 20)
+
+
+def start_match(networked=False, undo=False):
+    """Set up a new board, seeding the computer player so replays record it."""
+    global replay_recorder, net_session
+    board = CarromBoard()
+    seed = random.randrange(2 ** 32)
+    random.seed(seed)
+    if computer_planner is not None:
+        computer_planner.cancel()
+        computer_planner.rng.seed(seed)
+    board.set_physics_rate(physics_rate)
+    board.profiler = profiler
+    if aim_preview:
+        board.preview = AimPreview()
+    if undo:
+        board.history = ShotHistory(20)
+    replay_recorder = ReplayRecorder(board, seed) if replay_dir else None
+    if networked:
+        from carrom_net import LockstepSession
+        net_session = LockstepSession(board, net_player, net_connection)
+    else:
+        net_session = None
+    return board
+
+
+def network_caption(session):
+    if session.desync is not None:
+        return "Carrom Game - out of sync after shot %d" % (session.desync + 1)
+    if session.error is not None:
+        return "Carrom Game - network error: %s" % session.error
+    if session.closed:
+        return "Carrom Game - the other player left"
+    if not session.ready:
+        return "Carrom Game - waiting for the other player"
+    if session.finished:
+        return "Carrom Game - network match over"
+    if session.my_turn:
+        return "Carrom Game - your turn"
+    return "Carrom Game - the other player's turn"
+
+
+def draw_hud(surface):
+    """Draw p50/p95/p99 frame times per phase, refreshed twice a second."""
+    global hud_surface
+    if hud_surface is None or profiler.index % 30 == 0:
+        rows = [("phase", "p50", "p95", "p99")]
+        rows += [(name,) + tuple("%.2f" % value for value in row)
+                 for name, *row in profiler.report()]
+        line_height = hud_font.get_linesize()
+        hud_surface = pygame.Surface((230, line_height * len(rows) + 8), pygame.SRCALPHA)
+        hud_surface.fill((255, 255, 255, 210))
+        for i, row in enumerate(rows):
+            y = 4 + i * line_height
+            hud_surface.blit(hud_font.render(row[0], True, black), (6, y))
+            # Right-align the numbers in their columns
+            for column, text in enumerate(row[1:]):
+                label = hud_font.render(text, True, black)
+                hud_surface.blit(label, (130 + 45 * column - label.get_width(), y))
+    surface.blit(hud_surface, (5, 5))
+    # The board does not know to redraw under the HUD
+    dirty_rects.invalidate()
+
+
+def screen_layer():
+    """A blank window-sized layer to compose a screen on."""
+    layer = pygame.Surface((width, height)).convert()
+    layer.fill(white)
+    return layer
+
+
+def welcome_screen():
+    layer = screen_layer()
+    title_text = render_text(title_font, "Carrom Game", black)
+    title_rect = title_text.get_rect(center=(width//2, height//4))
+    layer.blit(title_text, title_rect)
+    return MenuScreen(layer, [("vs friend", vs_friend_button),
+                              ("vs computer", vs_computer_button),
+                              ("instructions", instructions_button)])
+
 
-# Create carrom board
-carrom_board = CarromBoard()
+def instructions_screen():
+    layer = screen_layer()
+    title_text = render_text(button_font, "How to Play", black)
+    title_rect = title_text.get_rect(center=(width//2, 50))
+    layer.blit(title_text, title_rect)
+    
+    # Instructions text
+    instructions = [
+        "OBJECTIVE:",
+        "- Pocket all your coins and the queen to win",
+        "- Black coins: 1 point each",
+        "- White coins: 2 points each",
+        "- Queen (red): 5 points",
+        "",
+        "HOW TO PLAY:",
+        "1. Player 1 plays from the bottom, Player 2 from the top",
+        "2. Position the striker by moving your mouse along your baseline",
+        "3. Click to select the striker",
+        "4. Move the mouse to aim (red line shows direction and power)",
+        "5. Click again to shoot",
+        "6. Players take turns after each shot",
+        "",
+        "CONTROLS:",
+        "- Mouse movement: Position/aim striker",
+        "- Left click: Select/shoot striker",
+        "- First to 21 points wins!"
+    ]
+    
+    # Draw instructions text
+    y_offset = 100
+    for line in instructions:
+        if line.startswith("-") or line.startswith("•"):
+            # Indent bullet points
+            text = render_text(score_font, line, black)
+            layer.blit(text, (width//2 - 180, y_offset))
+        elif line.startswith("1") or line.startswith("2") or line.startswith("3") or line.startswith("4") or line.startswith("5"):
+            # Indent numbered points
+            text = render_text(score_font, line, black)
+            layer.blit(text, (width//2 - 180, y_offset))
+        elif line == "":
+            # Empty line for spacing
+            pass
+        else:
+            # Section headers
+            text = render_text(score_font, line, black)
+            text_rect = text.get_rect(center=(width//2, y_offset))
+            layer.blit(text, text_rect)
+        
+        y_offset += 30
+    
+    # Back button
+    back_text = render_text(button_font, "Back to Menu", black)
+    back_rect = back_text.get_rect(center=(width//2, height - 50))
+    pygame.draw.rect(layer, lightbrown, 
+                    (back_rect.x - 10, back_rect.y - 10, 
+                     back_rect.width + 20, back_rect.height + 20),
+                    border_radius=10)
+    pygame.draw.rect(layer, black, 
+                    (back_rect.x - 10, back_rect.y - 10, 
+                     back_rect.width + 20, back_rect.height + 20),
+                    2, border_radius=10)
+    layer.blit(back_text, back_rect)
+    return MenuScreen(layer, areas=[("back", back_rect)])
 
-# Main game loop
-running = True
-clock = pygame.time.Clock()
 
-while running:
-    mouse_pos = pygame.mouse.get_pos()
-    mouse_clicked = False
+def game_over_screen(board, mode):
+    """The finished board under a white veil, for a match played in mode."""
+    layer = screen_layer()
+    board.draw(layer)
     
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:  # Left mouse button
-                mouse_clicked = True
+    # Semi-transparent overlay, blended into the layer once
+    overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+    overlay.fill((255, 255, 255, 200))  # White with alpha
+    layer.blit(overlay, (0, 0))
     
-    # Fill the background
-    window.fill(white)
+    # Determine winner message
+    winner = board.check_winner()
+    if winner == 1:
+        winner_text = "Player 1 Wins!"
+    elif winner == 2:
+        if mode == VS_COMPUTER:
+            winner_text = "Computer Wins!"
+        else:
+            winner_text = "Player 2 Wins!"
+    else:
+        winner_text = "It's a Tie!"
     
-    # Handle different game states
-    if game_state == WELCOME_SCREEN:
-        # Draw title
-        title_text = title_font.render("Carrom Game", True, black)
-        title_rect = title_text.get_rect(center=(width//2, height//4))
-        window.blit(title_text, title_rect)
-        
-        # Draw and check buttons
-        vs_friend_button.check_hover(mouse_pos)
-        vs_computer_button.check_hover(mouse_pos)
-        instructions_button.check_hover(mouse_pos)
-        
-        vs_friend_button.draw(window)
-        vs_computer_button.draw(window)
-        instructions_button.draw(window)
-        
-        if vs_friend_button.is_clicked(mouse_pos, mouse_clicked):
-            game_state = VS_FRIEND
-            carrom_board = CarromBoard()  # Reset the board
-        
-        if vs_computer_button.is_clicked(mouse_pos, mouse_clicked):
-            game_state = VS_COMPUTER
-            carrom_board = CarromBoard()  # Reset the board
-            
-        if instructions_button.is_clicked(mouse_pos, mouse_clicked):
-            game_state = INSTRUCTIONS
+    # Draw winner text
+    game_over_text = render_text(title_font, "Game Over", black)
+    winner_surface = render_text(button_font, winner_text, black)
+    score_text = render_text(button_font, f"Score: {board.scores[0]} - {board.scores[1]}", black)
     
-    elif game_state == INSTRUCTIONS:
-        # Draw title
-        title_text = button_font.render("How to Play", True, black)
-        title_rect = title_text.get_rect(center=(width//2, 50))
-        window.blit(title_text, title_rect)
-        
-        # Instructions text
-        instructions = [
-            "OBJECTIVE:",
-            "- Pocket all your coins and the queen to win",
-            "- Black coins: 1 point each",
-            "- White coins: 2 points each",
-            "- Queen (red): 5 points",
-            "",
-            "HOW TO PLAY:",
-            "1. Player 1 plays from the bottom, Player 2 from the top",
-            "2. Position the striker by moving your mouse along your baseline",
-            "3. Click to select the striker",
-            "4. Move the mouse to aim (red line shows direction and power)",
-            "5. Click again to shoot",
-            "6. Players take turns after each shot",
-            "",
-            "CONTROLS:",
-            "- Mouse movement: Position/aim striker",
-            "- Left click: Select/shoot striker",
-            "- First to 21 points wins!"
-        ]
-        
-        # Draw instructions text
-        y_offset = 100
-        for line in instructions:
-            if line.startswith("-") or line.startswith("•"):
-                # Indent bullet points
-                text = score_font.render(line, True, black)
-                window.blit(text, (width//2 - 180, y_offset))
-            elif line.startswith("1") or line.startswith("2") or line.startswith("3") or line.startswith("4") or line.startswith("5"):
-                # Indent numbered points
-                text = score_font.render(line, True, black)
-                window.blit(text, (width//2 - 180, y_offset))
-            elif line == "":
-                # Empty line for spacing
-                pass
-            else:
-                # Section headers
-                text = score_font.render(line, True, black)
-                text_rect = text.get_rect(center=(width//2, y_offset))
-                window.blit(text, text_rect)
-            
-            y_offset += 30
-        
-        # Back button
-        back_text = button_font.render("Back to Menu", True, black)
-        back_rect = back_text.get_rect(center=(width//2, height - 50))
-        pygame.draw.rect(window, lightbrown, 
-                        (back_rect.x - 10, back_rect.y - 10, 
-                         back_rect.width + 20, back_rect.height + 20),
-                        border_radius=10)
-        pygame.draw.rect(window, black, 
-                        (back_rect.x - 10, back_rect.y - 10, 
-                         back_rect.width + 20, back_rect.height + 20),
-                        2, border_radius=10)
-        window.blit(back_text, back_rect)
-        
-        # Check if back button is clicked
-        if mouse_clicked and back_rect.collidepoint(mouse_pos):
-            game_state = WELCOME_SCREEN
+    game_over_rect = game_over_text.get_rect(center=(width//2, height//2 - 80))
+    winner_rect = winner_surface.get_rect(center=(width//2, height//2))
+    score_rect = score_text.get_rect(center=(width//2, height//2 + 60))
+    
+    layer.blit(game_over_text, game_over_rect)
+    layer.blit(winner_surface, winner_rect)
+    layer.blit(score_text, score_rect)
+    
+    # Draw game mode text
+    mode_text = "Friend Mode" if mode == VS_FRIEND else "Computer Mode"
+    mode_surface = render_text(button_font, mode_text, black)
+    layer.blit(mode_surface, (20, 20))
+    
+    # Game instructions based on the phase the board finished in
+    instruction_text = ""
+    if board.game_phase == "positioning":
+        instruction_text = "Move mouse to position striker, then click to select"
+    elif board.game_phase == "aiming":
+        instruction_text = "Move mouse to aim, click to shoot"
+    elif board.game_phase == "waiting":
+        instruction_text = "Wait for pieces to stop moving..."
+    
+    if instruction_text:
+        instruction_surface = render_text(score_font, instruction_text, black)
+        instruction_rect = instruction_surface.get_rect(center=(width//2, 20))
+        layer.blit(instruction_surface, instruction_rect)
+    
+    # Back button
+    back_text = render_text(button_font, "Back to Menu", black)
+    back_rect = back_text.get_rect(topleft=(20, height - 50))
+    pygame.draw.rect(layer, lightbrown, 
+                    (back_rect.x - 5, back_rect.y - 5, 
+                     back_rect.width + 10, back_rect.height + 10),
+                    border_radius=5)
+    pygame.draw.rect(layer, black, 
+                    (back_rect.x - 5, back_rect.y - 5, 
+                     back_rect.width + 10, back_rect.height + 10),
+                    2, border_radius=5)
+    layer.blit(back_text, back_rect)
+    
+    # Help button
+    help_text = render_text(button_font, "?", black)
+    help_rect = help_text.get_rect(topright=(width - 20, 20))
+    pygame.draw.circle(layer, lightbrown, help_rect.center, 20)
+    pygame.draw.circle(layer, black, help_rect.center, 20, 2)
+    layer.blit(help_text, help_rect)
+    
+    return MenuScreen(layer, [("play again", play_again_button)],
+                      [("back", back_rect),
+                       ("help", pygame.Rect(help_rect.x - 20, help_rect.y - 20, 41, 41))])
+
+
+def main(argv=None):
+    """Open the window and run the game until it is closed."""
+    global window, replay_recorder, net_session, net_connection
+    parse_args(sys.argv[1:] if argv is None else argv)
+    pygame.init()
+    window = pygame.display.set_mode((width, height))
+    pygame.display.set_caption("Carrom Game")
+    load_fonts()
+
+    carrom_board = CarromBoard()
+    game_state = WELCOME_SCREEN
+    match_state = VS_FRIEND  # the mode of the last match, for the game over screen
+    # Menus and the game over screen are composed when they are entered
+    shown_state = None
+    screen = None
+    menu_screens = {}
+    fixed_step = FixedTimestep(physics_rate)
+    net_caption = None
+    show_hud = False
+
+    # Main game loop
+    running = True
+    clock = pygame.time.Clock()
+    frame_seconds = 1 / 60
+
+    while running:
+        profiler.begin_frame()
+        mouse_pos = pygame.mouse.get_pos()
+        mouse_clicked = False
+        undo_clicked = False
     
-    elif game_state == VS_FRIEND or game_state == VS_COMPUTER:
-        # Update game logic
-        carrom_board.update()
-        
-        # Handle input based on game mode and turn
-        is_computer_turn = (game_state == VS_COMPUTER and carrom_board.turn == 1)
-        carrom_board.handle_input(mouse_pos, mouse_clicked, is_computer_turn)
-        
-        # Check for winner
-        winner = carrom_board.check_winner()
-        if winner > 0:
-            game_state = GAME_OVER
-        
-        # Draw the carrom board
-        carrom_board.draw(window)
-        
-    elif game_state == GAME_OVER:
-        # Draw the carrom board in the background
-        carrom_board.draw(window)
-        
-        # Draw semi-transparent overlay
-        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
-        overlay.fill((255, 255, 255, 200))  # White with alpha
-        window.blit(overlay, (0, 0))
-        
-        # Determine winner message
-        winner = carrom_board.check_winner()
-        if winner == 1:
-            winner_text = "Player 1 Wins!"
-        elif winner == 2:
-            if game_state == VS_COMPUTER:
-                winner_text = "Computer Wins!"
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:  # Left mouse button
+                    mouse_clicked = True
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_hud = not show_hud
+                dirty_rects.invalidate()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE:
+                undo_clicked = True
+    
+        # Network messages; the last board hash is still checked after game over
+        if net_session is not None:
+            with profiler.phase("network"):
+                net_session.poll()
+            caption = network_caption(net_session)
+            if caption != net_caption:
+                pygame.display.set_caption(caption)
+                net_caption = caption
+            if net_session.finished or net_session.closed:
+                # One match per connection; later matches are played locally
+                net_session.detach()
+                net_session = None
+                net_connection.close()
+                net_connection = None
+    
+        screen_start = time.perf_counter()
+        screen_phase = screen_phases.get(game_state)
+    
+        # Compose a menu or the game over screen once, on entering it; the
+        # first frame after any change of screen repaints the whole window
+        if game_state != shown_state:
+            shown_state = game_state
+            dirty_rects.invalidate()
+            if game_state == WELCOME_SCREEN or game_state == INSTRUCTIONS:
+                if game_state not in menu_screens:
+                    menu_screens[game_state] = (welcome_screen() if game_state == WELCOME_SCREEN
+                                                else instructions_screen())
+                screen = menu_screens[game_state]
+            elif game_state == GAME_OVER:
+                screen = game_over_screen(carrom_board, match_state)
             else:
-                winner_text = "Player 2 Wins!"
-        else:
-            winner_text = "It's a Tie!"
-            
-        # Draw winner text
-        game_over_text = title_font.render("Game Over", True, black)
-        winner_surface = button_font.render(winner_text, True, black)
-        score_text = button_font.render(f"Score: {carrom_board.scores[0]} - {carrom_board.scores[1]}", True, black)
-        
-        game_over_rect = game_over_text.get_rect(center=(width//2, height//2 - 80))
-        winner_rect = winner_surface.get_rect(center=(width//2, height//2))
-        score_rect = score_text.get_rect(center=(width//2, height//2 + 60))
-        
-        window.blit(game_over_text, game_over_rect)
-        window.blit(winner_surface, winner_rect)
-        window.blit(score_text, score_rect)
-        
-        # Play again button
-        play_again_button = Button(width//2 - 150, height//2 + 120, 300, 60, "Play Again", lightbrown, beige)
-        play_again_button.check_hover(mouse_pos)
-        play_again_button.draw(window)
-        
-        if play_again_button.is_clicked(mouse_pos, mouse_clicked):
-            game_state = WELCOME_SCREEN
-        
-        # Draw game mode text
-        mode_text = "Friend Mode" if game_state == VS_FRIEND else "Computer Mode"
-        mode_surface = button_font.render(mode_text, True, black)
-        window.blit(mode_surface, (20, 20))
-        
-        # Game instructions based on current phase
-        instruction_text = ""
-        if carrom_board.game_phase == "positioning":
-            instruction_text = "Move mouse to position striker, then click to select"
-        elif carrom_board.game_phase == "aiming":
-            instruction_text = "Move mouse to aim, click to shoot"
-        elif carrom_board.game_phase == "waiting":
-            instruction_text = "Wait for pieces to stop moving..."
-            
-        if instruction_text:
-            instruction_surface = score_font.render(instruction_text, True, black)
-            instruction_rect = instruction_surface.get_rect(center=(width//2, 20))
-            window.blit(instruction_surface, instruction_rect)
-        
-        # Back button
-        back_text = button_font.render("Back to Menu", True, black)
-        back_rect = back_text.get_rect(topleft=(20, height - 50))
-        pygame.draw.rect(window, lightbrown, 
-                        (back_rect.x - 5, back_rect.y - 5, 
-                         back_rect.width + 10, back_rect.height + 10),
-                        border_radius=5)
-        pygame.draw.rect(window, black, 
-                        (back_rect.x - 5, back_rect.y - 5, 
-                         back_rect.width + 10, back_rect.height + 10),
-                        2, border_radius=5)
-        window.blit(back_text, back_rect)
-        
-        # Help button
-        help_text = button_font.render("?", True, black)
-        help_rect = help_text.get_rect(topright=(width - 20, 20))
-        pygame.draw.circle(window, lightbrown, help_rect.center, 20)
-        pygame.draw.circle(window, black, help_rect.center, 20, 2)
-        window.blit(help_text, help_rect)
-        
-        # Check if back button is clicked
-        if mouse_clicked and back_rect.collidepoint(mouse_pos):
-            game_state = WELCOME_SCREEN
-            
-        # Check if help button is clicked
-        if mouse_clicked and (help_rect.x - 20 <= mouse_pos[0] <= help_rect.x + 20) and (help_rect.y - 20 <= mouse_pos[1] <= help_rect.y + 20):
-            game_state = INSTRUCTIONS
+                screen = None
+    
+        # Handle different game states
+        if game_state == WELCOME_SCREEN:
+            screen.draw(window, mouse_pos, dirty_rects)
+            clicked = screen.clicked(mouse_pos, mouse_clicked)
+            if clicked == "vs friend":
+                game_state = VS_FRIEND
+                carrom_board = start_match(networked=net_connection is not None,
+                                           undo=net_connection is None)  # Reset the board
+            elif clicked == "vs computer":
+                game_state = VS_COMPUTER
+                carrom_board = start_match()  # Reset the board
+            elif clicked == "instructions":
+                game_state = INSTRUCTIONS
+    
+        elif game_state == INSTRUCTIONS:
+            screen.draw(window, mouse_pos, dirty_rects)
+            if screen.clicked(mouse_pos, mouse_clicked) == "back":
+                game_state = WELCOME_SCREEN
+    
+        elif game_state == VS_FRIEND or game_state == VS_COMPUTER:
+            # Backspace takes back the last shot in a local game against a friend
+            if undo_clicked and carrom_board.undo_shot():
+                if replay_recorder is not None:
+                    replay_recorder.replay.shots.pop()
+                fixed_step.previous = []
+                dirty_rects.invalidate()
+        
+            # Update game logic for the real time since the last frame
+            with profiler.phase("physics"):
+                fixed_step.advance(carrom_board, frame_seconds)
+        
+            # Handle input based on game mode and turn; in a network match the
+            # other player's shots arrive through net_session instead
+            is_computer_turn = (game_state == VS_COMPUTER and carrom_board.turn == 1)
+            if net_session is None or net_session.my_turn:
+                with profiler.phase("input"):
+                    carrom_board.handle_input(mouse_pos, mouse_clicked, is_computer_turn, computer_planner)
+            if broadcaster is not None:
+                with profiler.phase("broadcast"):
+                    broadcaster.publish_threadsafe(carrom_board)
+        
+            # Check for winner
+            winner = carrom_board.check_winner()
+            if winner > 0:
+                match_state = game_state
+                game_state = GAME_OVER
+                if replay_recorder is not None:
+                    replay = replay_recorder.finish(carrom_board)
+                    replay_recorder = None
+                    name = "carrom-%s-%d.crpl" % (time.strftime("%Y%m%d-%H%M%S"), replay.seed)
+                    replay.save(os.path.join(replay_dir, name))
+        
+            # Draw the carrom board, moving pieces blended between physics steps
+            with profiler.phase("draw"), fixed_step.interpolated():
+                carrom_board.draw(window, dirty_rects)
+        
+        elif game_state == GAME_OVER:
+            screen.draw(window, mouse_pos, dirty_rects)
+            clicked = screen.clicked(mouse_pos, mouse_clicked)
+            if clicked == "play again" or clicked == "back":
+                game_state = WELCOME_SCREEN
+            elif clicked == "help":
+                game_state = INSTRUCTIONS
     
-    # Update the display
-    pygame.display.flip()
+        if screen_phase is not None:
+            profiler.lap(screen_phase, screen_start)
     
-    # Cap the frame rate
-    clock.tick(60)
+        if show_hud:
+            with profiler.phase("hud"):
+                draw_hud(window)
+    
+        # Update the display
+        with profiler.phase("present"):
+            dirty_rects.present()
+        profiler.end_frame()
+    
+        # Cap the frame rate
+        frame_seconds = clock.tick(60) / 1000
+
+    if computer_planner is not None:
+        computer_planner.close()
+    if net_connection is not None:
+        net_connection.close()
+    if profile_path is not None:
+        profiler.save(profile_path)
+    pygame.quit()
+
 
-pygame.quit()
-sys.exit()
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ import sys
 import random
 import os
 
+from text_cache import render_text
+from dirty_rects import DirtyRects
+
 # initialize pygame
 pygame.init()
 
@@ -53,6 +56,9 @@ red = (255, 0, 0)
 screen = pygame.display.set_mode((width, height))
 pygame.display.set_caption('Flappy Bird')
 clock = pygame.time.Clock()
+
+# opt-in: present only the parts of the screen that changed
+dirty_rects = DirtyRects(enabled="--dirty-rects" in sys.argv)
 font = pygame.font.SysFont('Arial', 30)
 big_font = pygame.font.SysFont('Arial', 50)
 
@@ -90,6 +96,7 @@ class Bird:
         pygame.draw.polygon(screen, red, [(self.x + self.height // 2, self.y + self.height // 2), 
                                          (self.x + self.height // 2 + 10, self.y + self.height // 2 - 5),
                                          (self.x + self.height // 2 + 10, self.y + self.height // 2 + 5)])
+        dirty_rects.changed("bird", (self.x - self.height // 2, int(self.y), self.height + 11, self.height + 1))
     
     def get_mask(self):
         # return a rectangle for collision detection
@@ -113,6 +120,8 @@ class Pipe:
     def draw(self):
         pygame.draw.rect(screen, green, self.top_pipe)
         pygame.draw.rect(screen, green, self.bottom_pipe)
+        dirty_rects.changed(("top pipe", id(self)), self.top_pipe)
+        dirty_rects.changed(("bottom pipe", id(self)), self.bottom_pipe)
     
     def collide(self, bird):
         bird_mask = bird.get_mask()
@@ -122,38 +131,64 @@ class Pipe:
         return self.x + 60 < 0
 
 # game functions
-def draw_floor():
-    pygame.draw.rect(screen, green, (0, height - groundheight, width, groundheight))
+def draw_floor(surface=screen):
+    pygame.draw.rect(surface, green, (0, height - groundheight, width, groundheight))
 
-def draw_background():
-    screen.fill(skyblue)
+def paint_background(surface):
+    surface.fill(skyblue)
     # draw some clouds
     for i in range(3):
-        pygame.draw.circle(screen, white, (100 + i * 150, 100), 30)
-        pygame.draw.circle(screen, white, (130 + i * 150, 100), 30)
-        pygame.draw.circle(screen, white, (115 + i * 150, 80), 30)
+        pygame.draw.circle(surface, white, (100 + i * 150, 100), 30)
+        pygame.draw.circle(surface, white, (130 + i * 150, 100), 30)
+        pygame.draw.circle(surface, white, (115 + i * 150, 80), 30)
+
+# sky, clouds and floor drawn once, for dirty-rect mode
+background_layer = None
+
+def draw_background():
+    global background_layer
+    if not dirty_rects.enabled:
+        paint_background(screen)
+        return
+    
+    if background_layer is None:
+        background_layer = pygame.Surface((width, height))
+        paint_background(background_layer)
+        draw_floor(background_layer)
+        background_layer = background_layer.convert()
+    if dirty_rects.full:
+        screen.blit(background_layer, (0, 0))
+    else:
+        # everything is drawn again each frame, so only rub out last frame's items
+        for rect in dirty_rects.previous_rects():
+            screen.blit(background_layer, rect, rect)
+
+def draw_text(key, text_surface, position):
+    screen.blit(text_surface, position)
+    # cached text surfaces only change when the string does
+    dirty_rects.changed(key, text_surface.get_rect(topleft=position), text_surface)
 
 def display_score(score, high_score, current_speed=None):
-    score_text = font.render(f'Score: {score}', True, black)
-    high_score_text = font.render(f'High Score: {high_score}', True, black)
-    screen.blit(score_text, (10, 10))
-    screen.blit(high_score_text, (10, 50))
+    score_text = render_text(font, f'Score: {score}', black)
+    high_score_text = render_text(font, f'High Score: {high_score}', black)
+    draw_text("score", score_text, (10, 10))
+    draw_text("high score", high_score_text, (10, 50))
     
     # display current speed if provided
     if current_speed is not None:
-        speed_text = font.render(f'Speed: {current_speed:.1f}x', True, black)
-        screen.blit(speed_text, (10, 90))
+        speed_text = render_text(font, f'Speed: {current_speed:.1f}x', black)
+        draw_text("speed", speed_text, (10, 90))
 
 def display_game_over(score, high_score):
-    game_over_text = big_font.render('Game Over', True, black)
-    score_text = font.render(f'Final Score: {score}', True, black)
-    high_score_text = font.render(f'High Score: {high_score}', True, black)
-    restart_text = font.render('Press SPACE to restart', True, black)
+    game_over_text = render_text(big_font, 'Game Over', black)
+    score_text = render_text(font, f'Final Score: {score}', black)
+    high_score_text = render_text(font, f'High Score: {high_score}', black)
+    restart_text = render_text(font, 'Press SPACE to restart', black)
     
-    screen.blit(game_over_text, (width // 2 - game_over_text.get_width() // 2, height // 3))
-    screen.blit(score_text, (width // 2 - score_text.get_width() // 2, height // 2 - 20))
-    screen.blit(high_score_text, (width // 2 - high_score_text.get_width() // 2, height // 2 + 20))
-    screen.blit(restart_text, (width // 2 - restart_text.get_width() // 2, height // 2 + 70))
+    draw_text("game over", game_over_text, (width // 2 - game_over_text.get_width() // 2, height // 3))
+    draw_text("final score", score_text, (width // 2 - score_text.get_width() // 2, height // 2 - 20))
+    draw_text("final high score", high_score_text, (width // 2 - high_score_text.get_width() // 2, height // 2 + 20))
+    draw_text("restart", restart_text, (width // 2 - restart_text.get_width() // 2, height // 2 + 70))
 
 def welcome_screen():
     running = True
@@ -172,11 +207,11 @@ def welcome_screen():
         draw_floor()
         
         # title
-        title_text = big_font.render('FLAPPY BIRD', True, black)
+        title_text = render_text(big_font, 'FLAPPY BIRD', black)
         screen.blit(title_text, (width // 2 - title_text.get_width() // 2, height // 3))
         
         # instructions
-        instruction_text = font.render('Press SPACE to start', True, black)
+        instruction_text = render_text(font, 'Press SPACE to start', black)
         screen.blit(instruction_text, (width // 2 - instruction_text.get_width() // 2, height // 2))
         
         # Draw a sample bird
@@ -198,6 +233,7 @@ def main_game():
     jump_cooldown = 0  # Cooldown timer for jumps
     jump_cooldown_time = 200  # Milliseconds between jumps when holding space
     current_game_speed = initialspeed  # Start with initial speed
+    dirty_rects.invalidate()  # the welcome screen covered everything
     
     while True:
         current_time = pygame.time.get_ticks()
@@ -278,13 +314,14 @@ def main_game():
             # display game over screen
             display_game_over(score, high_score)
 
-        # draw floor
-        draw_floor()
+        # draw floor (already part of the background in dirty-rect mode)
+        if not dirty_rects.enabled:
+            draw_floor()
         
         # display score and current speed
         display_score(score, high_score, current_game_speed)
         
-        pygame.display.update()
+        dirty_rects.present()
         clock.tick(60)
 
 # main game loop
@@ -0,0 +1,229 @@
+"""Benchmarks for the Carrom physics and the Flappy Bird simulation.
+
+Each scenario sets up a fixed, seeded situation and is timed over several
+runs; the fastest run is reported as nanoseconds per step and steps per
+second (slower runs are other processes getting in the way, as with
+timeit), with the peak memory the scenario allocated (from tracemalloc, in a
+separate untimed run). Results can be saved as JSON and compared against
+an earlier run, flagging every scenario that got slower than a threshold:
+
+    python benchmarks.py --out baseline.json
+    ... change something ...
+    python benchmarks.py --compare baseline.json
+
+A step is one physics step for Carrom (one board's step in the batch
+scenario) and one game frame for Flappy Bird.
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from carrom_ai import candidate_shots, simple_shot
+from carrom_engine import BoardState, MAX_POWER
+
+FLAPPY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Flappy Bird.py")
+
+
+def opening_break():
+    """The first shot of a game, straight up the middle at full power."""
+    board = BoardState()
+    board.take_shot(board.width / 2, -math.pi / 2, MAX_POWER)
+    return board.run_until_rest
+
+
+def cluster_shot():
+    """A full-power shot into 80 coins packed together around the queen."""
+    board = BoardState(black=40, white=40, coin_radius=10)
+    board.take_shot(board.width / 2 + 15, -math.pi / 2, MAX_POWER)
+    return board.run_until_rest
+
+
+def stress_board():
+    """A full-power shot into a 200-coin board."""
+    board = BoardState(black=100, white=100, coin_radius=6)
+    board.take_shot(board.width / 2 + 5, -math.pi / 2, MAX_POWER)
+    return board.run_until_rest
+
+
+def ai_game():
+    """A whole game between two simple computer players, played like the game loop."""
+    board = BoardState()
+    rng = random.Random(1)
+
+    def run():
+        steps = 0
+        while not board.check_winner():
+            board.take_shot(*simple_shot(board, rng))
+            while board.game_phase == "waiting" and not board.check_winner():
+                board.update()
+                steps += 1
+        return steps
+    return run
+
+
+def batch_shots():
+    """1000 candidate opening shots simulated together by carrom_batch (needs numpy)."""
+    from carrom_batch import simulate_shots
+
+    board = BoardState()
+    shots = candidate_shots(board, 1000, random.Random(1))
+
+    def run():
+        # Counted as one step per board per frame it was moving
+        return int(simulate_shots(board, shots).frames.sum())
+    return run
+
+
+def load_flappy():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    spec = importlib.util.spec_from_file_location("flappy_bird", FLAPPY_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def flappy_frames(frames=10000):
+    """Bird.move, Pipe.move and Pipe.collide for 10k frames with scripted flaps.
+
+    The bird flaps whenever it drops below the middle of the next gap, a
+    new pipe comes every 60 frames, and a crashed bird is simply replaced,
+    so every run simulates the same frames.
+    """
+    flappy = load_flappy()
+
+    def run():
+        random.seed(1)
+        bird = flappy.Bird()
+        pipes = []
+        for frame in range(frames):
+            if frame % 60 == 0:
+                pipes.append(flappy.Pipe(flappy.initialspeed))
+            target = pipes[0].height + flappy.pipegap / 2 if pipes else flappy.height / 2
+            if bird.y > target and bird.velocity >= 0:
+                bird.jump()
+            bird.move()
+            for pipe in pipes:
+                pipe.move()
+                if pipe.collide(bird):
+                    bird.alive = False
+            pipes = [pipe for pipe in pipes if not pipe.is_off_screen()]
+            if not bird.alive:
+                bird = flappy.Bird()
+        return frames
+    return run
+
+
+SCENARIOS = {
+    "carrom opening break": opening_break,
+    "carrom cluster shot": cluster_shot,
+    "carrom 200 coins": stress_board,
+    "carrom ai game": ai_game,
+    "carrom batch 1k shots": batch_shots,
+    "flappy 10k frames": flappy_frames,
+}
+
+
+def measure(scenario, repeat=5):
+    """Time a scenario repeat times; returns its result as a dict."""
+    times = []
+    for i in range(repeat):
+        run = scenario()
+        start = time.perf_counter()
+        steps = run()
+        times.append(time.perf_counter() - start)
+
+    # Memory is measured separately, tracing slows everything down
+    run = scenario()
+    tracemalloc.start()
+    run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "steps": steps,
+        "ns_per_step": best / steps * 1e9,
+        "ns_per_step_median": statistics.median(times) / steps * 1e9,
+        "steps_per_sec": steps / best,
+        "peak_alloc_kb": peak / 1024,
+    }
+
+
+def run_benchmarks(names=None, repeat=5, report=print):
+    results = {}
+    for name, scenario in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        results[name] = result = measure(scenario, repeat)
+        report("%-22s %7d steps %12.0f ns/step %10.0f steps/s %8.1f KB peak"
+               % (name, result["steps"], result["ns_per_step"], result["steps_per_sec"],
+                  result["peak_alloc_kb"]))
+    return {
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "repeat": repeat,
+        "scenarios": results,
+    }
+
+
+def compare(results, baseline, threshold=0.10):
+    """Lines comparing two runs, and whether any scenario got slower than threshold."""
+    lines = []
+    regressed = False
+    for name, result in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            lines.append("%-22s new" % name)
+            continue
+        change = result["ns_per_step"] / before["ns_per_step"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        if result["steps"] != before["steps"]:
+            # The physics itself changed, so the work is not the same either
+            flag += "  (steps %d -> %d)" % (before["steps"], result["steps"])
+        lines.append("%-22s %12.0f -> %12.0f ns/step %+7.1f%%%s"
+                     % (name, before["ns_per_step"], result["ns_per_step"], change * 100, flag))
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Carrom and Flappy Bird simulations.")
+    parser.add_argument("scenarios", nargs="*", help="run only these (default: all of %s)"
+                        % ", ".join(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per scenario")
+    parser.add_argument("--out", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved with --out")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown that counts as a regression (default 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario %r" % name)
+
+    results = run_benchmarks(args.scenarios, args.repeat)
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        lines, regressed = compare(results, baseline, args.threshold)
+        print()
+        for line in lines:
+            print(line)
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
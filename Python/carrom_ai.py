@@ -0,0 +1,265 @@
+"""Monte Carlo computer opponent for Carrom.
+
+ShotPlanner samples a few hundred candidate (position, angle, power) shots,
+simulates each one headless in a process pool, and picks the shot with
+the best expected score. Each candidate is played a few times with small
+execution errors so lucky one-off shots do not win.
+
+Candidates are simulated frame by frame like the game plays them: all
+at once by carrom_batch when numpy is installed, otherwise one at a time
+with the board's own physics. physics=EventPhysics() is quicker than the
+scalar engine, but its outcomes are only approximate and the shots it
+picks score far less in the game.
+
+Samples use a fixed pattern of small angle and power offsets rather than
+random noise, so when candidates are simulated one at a time,
+re-evaluating one from the same board is answered by each worker's
+ShotCache.
+
+The game loop calls poll() once per frame; it never waits on the pool, so
+thinking is spread across frames and stops at a fixed time budget.
+"""
+import importlib.util
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from carrom_cache import ShotCache
+from carrom_engine import MAX_POWER
+
+# Execution errors tried for repeated samples of the same candidate, as
+# (angle offset in radians, power factor)
+SAMPLE_OFFSETS = [(0, 1), (0.01, 1), (-0.01, 1), (0, 1.03), (0, 0.97)]
+
+# Outcomes simulated in this process; each worker keeps its own, and it
+# lives on across turns for as long as the pool does
+shot_cache = ShotCache()
+
+
+def simple_position(board, rng=random):
+    """Put the striker on a random free spot of the mover's baseline.
+
+    This is the simple computer player. Only if coins cover the whole
+    baseline does it settle for a spot that overlaps one.
+    """
+    x = board.free_baseline(board.turn).sample(rng.random())
+    if x is None:
+        x = rng.uniform(*board.baseline_bounds())
+    board.striker.position_on_baseline(board, x, board.turn)
+    return board.striker.x
+
+
+def simple_aim(board, rng=random):
+    """Aim roughly at the queen, else at a random coin; returns (angle, power)."""
+    striker = board.striker
+    target_x = board.board_x + board.board_size // 2
+    target_y = board.board_y + board.board_size // 2
+    available = [coin for coin in board.coins if not coin.pocketed]
+    if available:
+        queens = [coin for coin in available if coin.is_queen]
+        target = queens[0] if queens else rng.choice(available)
+        target_x, target_y = target.x, target.y
+
+    # Add some randomness for an imperfect aim
+    angle = math.atan2(target_y - striker.y, target_x - striker.x) + rng.uniform(-0.2, 0.2)
+    return angle, rng.uniform(10, 20)
+
+
+def simple_shot(board, rng=random):
+    """The simple computer player's whole shot as (x, angle, power)."""
+    x = simple_position(board, rng)
+    angle, power = simple_aim(board, rng)
+    return x, angle, power
+
+
+def best_shot(board, rng, candidates=240, samples=3, batched=False, physics=None):
+    """ShotPlanner's choice for the player to move, worked out in this process.
+
+    With batched, every sample of every candidate is simulated at once by
+    evaluate_shots_batched(); otherwise physics, if given, simulates them
+    instead of the board's own backend. Returns None if no legal shot
+    could be found.
+    """
+    snapshot = board.copy()
+    shots = candidate_shots(snapshot, candidates, rng)
+    if not shots:
+        return None
+    if batched:
+        results = evaluate_shots_batched(snapshot, shots, samples)
+    else:
+        results = evaluate_shots(snapshot, shots, samples, physics)
+    score, shot = max(results, key=lambda result: result[0])
+    return shot
+
+
+def candidate_shots(board, count, rng):
+    """Sample up to count legal shots for the player to move."""
+    player = board.turn
+    baseline_y = board.baseline_y(player)
+    targets = [coin for coin in board.coins if not coin.pocketed]
+    free = board.free_baseline(player)
+    if not free:
+        return []
+
+    shots = []
+    while len(shots) < count:
+        x = free.sample(rng.random())
+
+        choice = rng.random()
+        if targets and choice < 0.5:
+            # Aim the striker at the spot that knocks a coin toward a pocket
+            coin = rng.choice(targets)
+            pocket_x, pocket_y = rng.choice(board.pockets)
+            dx = pocket_x - coin.x
+            dy = pocket_y - coin.y
+            length = math.sqrt(dx * dx + dy * dy) or 1
+            contact = coin.radius + board.striker.radius
+            aim_x = coin.x - dx / length * contact
+            aim_y = coin.y - dy / length * contact
+            angle = math.atan2(aim_y - baseline_y, aim_x - x)
+        elif targets and choice < 0.85:
+            coin = rng.choice(targets)
+            angle = math.atan2(coin.y - baseline_y, coin.x - x) + rng.uniform(-0.2, 0.2)
+        else:
+            # Occasionally try anything, including bank shots
+            angle = rng.uniform(-math.pi, math.pi)
+        power = rng.uniform(8, MAX_POWER)
+        shots.append((x, angle, power))
+    return shots
+
+
+def evaluate_shots(board, shots, samples, physics=None):
+    """Return (expected score, shot) for each shot; runs in worker processes."""
+    results = []
+    for x, angle, power in shots:
+        total = 0
+        for angle_offset, power_factor in SAMPLE_OFFSETS[:samples]:
+            result = shot_cache.resolve(board, x, angle + angle_offset, power * power_factor, physics)
+            total += result.score_delta
+        results.append((total / samples, (x, angle, power)))
+    return results
+
+
+def evaluate_shots_batched(board, shots, samples):
+    """evaluate_shots() with all the simulations run together in carrom_batch.
+
+    Needs numpy. The batch plays frame by frame like VectorPhysics, so scores
+    can differ slightly from the scalar engine's.
+    """
+    from carrom_batch import simulate_shots
+
+    trials = [(x, angle + angle_offset, power * power_factor)
+              for x, angle, power in shots
+              for angle_offset, power_factor in SAMPLE_OFFSETS[:samples]]
+    scores = simulate_shots(board, trials).score_delta.reshape(len(shots), samples).mean(axis=1)
+    return [(float(score), shot) for score, shot in zip(scores, shots)]
+
+
+def numpy_available():
+    return importlib.util.find_spec("numpy") is not None
+
+
+def process_context():
+    """The multiprocessing context worker processes are started with."""
+    # Forking the game itself could copy a lock held by one of its threads
+    # (network, broadcaster, the pool's own manager) and deadlock. Workers
+    # fork from a single-threaded server instead, which imports the game
+    # and this module once so they still start quickly.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["__main__", "carrom_ai"])
+        return context
+    return multiprocessing.get_context()
+
+
+def process_pool(workers=None):
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=process_context())
+
+
+class ShotPlanner:
+    def __init__(self, candidates=240, samples=3, time_budget=1.0, batch_size=12,
+                 workers=None, seed=None, physics=None, batched=None):
+        self.candidates = candidates
+        self.samples = samples
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.physics = physics  # backend to simulate with instead of the board's
+        if batched is None:
+            batched = physics is None and numpy_available()
+        self.batched = batched  # each job simulated by evaluate_shots_batched()
+        self.executor = None
+        self.pending = []
+        self.deadline = 0
+        self.best = None
+        self.best_score = None
+        self.fallback = None
+
+    @property
+    def busy(self):
+        return self.deadline > 0
+
+    def start(self, board):
+        """Begin evaluating shots for the player to move on this board.
+
+        Returns False if no legal shot could be found to evaluate.
+        """
+        self.cancel()
+        if self.executor is None:
+            self.executor = process_pool(self.workers)
+
+        snapshot = board.copy()
+        shots = candidate_shots(snapshot, self.candidates, self.rng)
+        if not shots:
+            return False
+        self.fallback = shots[0]
+        self.best = None
+        self.best_score = None
+        self.deadline = time.perf_counter() + self.time_budget
+        for i in range(0, len(shots), self.batch_size):
+            batch = shots[i:i + self.batch_size]
+            if self.batched:
+                future = self.executor.submit(evaluate_shots_batched, snapshot, batch, self.samples)
+            else:
+                future = self.executor.submit(evaluate_shots, snapshot, batch, self.samples, self.physics)
+            self.pending.append(future)
+        return True
+
+    def poll(self):
+        """Return the chosen shot once thinking is over, else None; never blocks."""
+        if not self.busy:
+            return None
+
+        still_pending = []
+        for future in self.pending:
+            if not future.done():
+                still_pending.append(future)
+            elif not future.cancelled() and future.exception() is None:
+                for score, shot in future.result():
+                    if self.best_score is None or score > self.best_score:
+                        self.best_score = score
+                        self.best = shot
+        self.pending = still_pending
+
+        if self.pending and time.perf_counter() < self.deadline:
+            return None
+
+        shot = self.best or self.fallback
+        self.cancel()
+        return shot
+
+    def cancel(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending = []
+        self.deadline = 0
+
+    def close(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,278 @@
+"""Many Carrom boards simulated together in NumPy arrays.
+
+BatchPhysics holds K boards side by side in its arrays and advances all
+of them with the same handful of array operations per frame. A thousand
+shots take about as long as 75 shots simulated one at a time with the
+scalar engine: 1.5 s, against 20 s scalar or 13.7 s with VectorPhysics.
+Each frame does exactly what VectorPhysics does for one board, and every
+board's result is bit for bit what VectorPhysics gives for that board
+alone. Pocketed pieces are masked out of contacts; boards that come to
+rest are retired and dropped from the arrays, so only boards still moving
+cost anything.
+
+Boards in a batch must have the same geometry, physics rate and coins
+(they can differ in where the coins are and which are pocketed). Contacts
+always test every pair of every board still moving, which is most of the
+cost; about half the pieces of a batch are moving in an average frame, so
+skipping pairs that have not moved costs more in gathers than it saves.
+Very large boards are better left to VectorPhysics' grid.
+
+    result = simulate_shots(board, [(x, angle, power), ...])
+    result.score_delta[i], result.frames[i], result.pocketed[i]
+"""
+import math
+
+import numpy as np
+
+from carrom_engine import FRICTION, STOP_SPEED, WALL_RESTITUTION, POINTS, POWER_MULTIPLIER
+from carrom_vector import pair_indices
+
+
+# Final state of every board in a batch once it came to rest
+class BatchResult:
+    def __init__(self, position, velocity, pocketed, was_pocketed, frames, points, turns):
+        self.position = position  # (2, pieces, K), piece 0 is the striker
+        self.velocity = velocity
+        self.frames = frames  # steps each board ran for
+        newly = pocketed & ~was_pocketed
+        self.striker_pocketed = newly[0]
+        self.pocketed_mask = pocketed  # (pieces, K)
+        self.pocketed = [np.flatnonzero(column[1:]).tolist() for column in newly.T]  # coin indices
+        self.score_delta = (newly * points[:, None]).sum(axis=0)  # for the player who shot
+        self.turns = turns
+
+    def __len__(self):
+        return len(self.frames)
+
+    def apply(self, board, i):
+        """Put board i's final pieces and scores onto board, like the shot had run there."""
+        bodies = [board.striker] + board.coins
+        for row, body in enumerate(bodies):
+            body.x = float(self.position[0, row, i])
+            body.y = float(self.position[1, row, i])
+            body.velocity_x = float(self.velocity[0, row, i])
+            body.velocity_y = float(self.velocity[1, row, i])
+            body.pocketed = bool(self.pocketed_mask[row, i])
+        board.scores[int(self.turns[i])] += int(self.score_delta[i])
+        board.wake()
+
+
+class BatchPhysics:
+    def __init__(self, boards):
+        """Load the boards as they are now, shots already under way."""
+        first = boards[0]
+        geometry = (first.board_x, first.board_y, first.board_size, first.hole_radius, first.timestep)
+        radius = [body.radius for body in [first.striker] + first.coins]
+        kinds = [body.kind for body in [first.striker] + first.coins]
+        for board in boards:
+            bodies = [board.striker] + board.coins
+            if ((board.board_x, board.board_y, board.board_size, board.hole_radius, board.timestep)
+                    != geometry or [body.radius for body in bodies] != radius
+                    or [body.kind for body in bodies] != kinds):
+                raise ValueError("boards in a batch need the same geometry, rate and coins")
+
+        states = [[[body.x for body in bodies], [body.y for body in bodies]]
+                  for bodies in ([board.striker] + board.coins for board in boards)]
+        velocities = [[[body.velocity_x for body in bodies], [body.velocity_y for body in bodies]]
+                      for bodies in ([board.striker] + board.coins for board in boards)]
+        # Arrays are (axis, piece, board): the boards of one piece sit
+        # together, so gathering the pieces of every pair copies whole rows
+        position = np.array(states, dtype=float).transpose(1, 2, 0).copy()
+        velocity = np.array(velocities, dtype=float).transpose(1, 2, 0).copy()
+        pocketed = np.array([[body.pocketed for body in [board.striker] + board.coins]
+                             for board in boards], dtype=bool).T.copy()
+        self.setup(first, radius, kinds, position, velocity, pocketed,
+                   np.array([board.turn for board in boards]))
+
+    @classmethod
+    def for_shots(cls, board, shots):
+        """A batch of copies of board, each with one (x, angle, power) shot just played."""
+        batch = cls.__new__(cls)
+        bodies = [board.striker] + board.coins
+        count = len(shots)
+        position = np.empty((2, len(bodies), count))
+        position[0] = [[body.x] for body in bodies]
+        position[1] = [[body.y] for body in bodies]
+        velocity = np.empty((2, len(bodies), count))
+        velocity[0] = [[body.velocity_x] for body in bodies]
+        velocity[1] = [[body.velocity_y] for body in bodies]
+        pocketed = np.empty((len(bodies), count), dtype=bool)
+        pocketed[:] = [[body.pocketed] for body in bodies]
+
+        # The striker placed and shot as take_shot() does, with math's
+        # trigonometry so the velocities match to the bit
+        left, right = board.baseline_bounds()
+        max_power = board.striker.max_power
+        xs = []
+        velocity_x = []
+        velocity_y = []
+        for x, angle, power in shots:
+            power = min(power, max_power)
+            xs.append(max(left, min(x, right)))
+            velocity_x.append(math.cos(angle) * power * POWER_MULTIPLIER)
+            velocity_y.append(math.sin(angle) * power * POWER_MULTIPLIER)
+        position[0, 0] = xs
+        position[1, 0] = board.baseline_y(board.turn)
+        velocity[0, 0] = velocity_x
+        velocity[1, 0] = velocity_y
+        pocketed[0] = False
+
+        batch.setup(board, [body.radius for body in bodies], [body.kind for body in bodies],
+                    position, velocity, pocketed, np.full(count, board.turn))
+        return batch
+
+    def setup(self, board, radius, kinds, position, velocity, pocketed, turns):
+        count = position.shape[2]
+        self.position = position
+        self.velocity = velocity
+        self.pocketed = pocketed
+        self.boards = np.arange(count)  # which board each working column holds
+        self.start_pocketed = pocketed.copy()
+        self.turns = turns
+        self.points = np.array([POINTS[kind] for kind in kinds])
+
+        # Finished boards are copied out here as they come to rest
+        self.final_position = position.copy()
+        self.final_velocity = velocity.copy()
+        self.final_pocketed = pocketed.copy()
+        self.frames = np.zeros(count, dtype=np.intp)
+
+        self.timestep = board.timestep
+        self.friction = FRICTION ** board.timestep
+        radius = np.array(radius, dtype=float)
+        self.first, self.second = pair_indices(len(radius))
+        self.reach = radius[self.first] + radius[self.second]
+        self.reach_squared = self.reach * self.reach
+        low = np.array([board.board_x + radius, board.board_y + radius])
+        high = np.array([board.board_x + board.board_size - radius,
+                         board.board_y + board.board_size - radius])
+        self.low = low[:, :, None]
+        self.high = high[:, :, None]
+        self.board_low = np.array([board.board_x, board.board_y], dtype=float)[:, None, None]
+        self.board_high = self.board_low + board.board_size
+        self.hole_squared = float(board.hole_radius) ** 2
+
+    def step(self):
+        """Advance every board still in the arrays by one frame."""
+        velocity = self.velocity
+        if self.timestep == 1:
+            self.position += velocity
+        else:
+            self.position += velocity * self.timestep
+        velocity *= self.friction
+        stopped = (np.abs(velocity) < STOP_SPEED).all(axis=0)
+        velocity[:, stopped] = 0.0
+
+        self.resolve_contacts()
+        self.bounce_off_walls()
+        self.capture_pocketed()
+
+    def resolve_contacts(self):
+        x, y = self.position
+        first, second = self.first, self.second
+        dx = x[second] - x[first]
+        dy = y[second] - y[first]
+        distance_squared = dx * dx + dy * dy
+        hit = distance_squared < self.reach_squared[:, None]
+        if not hit.any():
+            return
+        hit &= ~(self.pocketed[first] | self.pocketed[second])
+        rows = np.flatnonzero(hit)
+        if rows.size == 0:
+            return
+
+        # Flat indices into the (piece, board) arrays. Each board's contacts
+        # come in VectorPhysics' pair order, so each piece's sums below are
+        # added up in the same order and come out the same to the bit
+        boards = x.shape[1]
+        pair, board = np.divmod(rows, boards)
+        a = first[pair] * boards + board
+        b = second[pair] * boards + board
+        dx = dx.ravel()[rows]
+        dy = dy.ravel()[rows]
+        distance = np.sqrt(distance_squared.ravel()[rows])
+        reach = self.reach[pair]
+
+        apart = distance > 0
+        safe_distance = np.where(apart, distance, 1.0)
+        nx = np.where(apart, dx / safe_distance, 1.0)
+        ny = np.where(apart, dy / safe_distance, 0.0)
+
+        vx = self.velocity[0].reshape(-1)
+        vy = self.velocity[1].reshape(-1)
+        velocity_normal = (vx[b] - vx[a]) * nx + (vy[b] - vy[a]) * ny
+        closing = velocity_normal <= 0
+        if not closing.all():
+            a, b = a[closing], b[closing]
+            nx, ny = nx[closing], ny[closing]
+            distance = distance[closing]
+            velocity_normal = velocity_normal[closing]
+            reach = reach[closing]
+
+        count = vx.size
+        impulse_x = velocity_normal * nx
+        impulse_y = velocity_normal * ny
+        vx += np.bincount(a, impulse_x, count) - np.bincount(b, impulse_x, count)
+        vy += np.bincount(a, impulse_y, count) - np.bincount(b, impulse_y, count)
+
+        overlap = (reach - distance) / 2
+        push_x = overlap * nx
+        push_y = overlap * ny
+        x = x.reshape(-1)
+        y = y.reshape(-1)
+        x += np.bincount(b, push_x, count) - np.bincount(a, push_x, count)
+        y += np.bincount(b, push_y, count) - np.bincount(a, push_y, count)
+
+    def bounce_off_walls(self):
+        clamped = np.clip(self.position, self.low, self.high)
+        hit = clamped != self.position
+        if hit.any():
+            self.position[...] = clamped
+            self.velocity[hit] *= -WALL_RESTITUTION
+
+    def capture_pocketed(self):
+        gap = np.minimum(self.position - self.board_low, self.board_high - self.position)
+        inside = (gap * gap).sum(axis=0) < self.hole_squared
+        if not inside.any():
+            return
+        new = inside & ~self.pocketed
+        if new.any():
+            self.pocketed |= new
+            self.velocity[:, new] = 0.0
+
+    def retire(self, done, frames):
+        """Copy the boards in working columns done out and drop them from the arrays."""
+        boards = self.boards[done]
+        self.final_position[:, :, boards] = self.position[:, :, done]
+        self.final_velocity[:, :, boards] = self.velocity[:, :, done]
+        self.final_pocketed[:, boards] = self.pocketed[:, done]
+        self.frames[boards] = frames
+        keep = ~done
+        self.boards = self.boards[keep]
+        # Contacts update the arrays through flat views, so keep them contiguous
+        self.position = np.ascontiguousarray(self.position[:, :, keep])
+        self.velocity = np.ascontiguousarray(self.velocity[:, :, keep])
+        self.pocketed = np.ascontiguousarray(self.pocketed[:, keep])
+
+    def run_until_rest(self, max_steps=10000):
+        """Step until every board is at rest; returns a BatchResult."""
+        steps = 0
+        while self.boards.size:
+            moving = self.velocity.any(axis=(0, 1))
+            if steps == max_steps:
+                moving[:] = False
+            if not moving.all():
+                self.retire(~moving, steps)
+                continue
+            self.step()
+            steps += 1
+        return BatchResult(self.final_position, self.final_velocity, self.final_pocketed,
+                           self.start_pocketed, self.frames, self.points, self.turns)
+
+
+def simulate_shots(board, shots, max_steps=10000):
+    """Play every (x, angle, power) shot from board at once; returns a BatchResult.
+
+    The board itself is not changed.
+    """
+    return BatchPhysics.for_shots(board, shots).run_until_rest(max_steps)
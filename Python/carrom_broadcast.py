@@ -0,0 +1,362 @@
+"""Live Carrom boards streamed to any number of spectators.
+
+BoardEncoder turns the board into one small frame per tick. Positions are
+quantized to 1/8 px. Every keyframe_interval ticks (and for a new board) it
+sends a keyframe with every piece, the scores, the turn and the game
+phase. In between it sends deltas that hold only the pieces that differ
+from the keyframe, as offsets from it, plus scores, turn and phase only
+if they changed. Pieces asleep since the keyframe cost nothing. Because
+every delta is measured from the keyframe rather than from the tick
+before, a viewer that misses some deltas is still right at the next one
+it gets.
+
+Broadcaster serves the frames to socket subscribers from an asyncio loop.
+Frames are written without waiting. A subscriber whose socket buffer is
+over high_water simply misses frames until it drains, so a slow viewer
+can't stall the match or the other viewers. When it catches up it gets
+the latest keyframe again if it missed one.
+
+Frames are a 2-byte length followed by the frame. BoardView decodes them.
+
+    python carrom_broadcast.py serve 5010     # a computer-vs-computer match
+    python carrom_broadcast.py watch 127.0.0.1:5010
+    python carrom_broadcast.py load 127.0.0.1:5010 300
+"""
+import asyncio
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+from carrom_ai import simple_shot
+from carrom_engine import BoardState, PHASES
+from carrom_net import parse_address
+
+KEYFRAME = 1
+DELTA = 2
+
+LENGTH = struct.Struct("<H")
+# kind, tick, scores, turn, phase, piece count; then a PIECE per piece
+KEY_HEADER = struct.Struct("<BIhhBBH")
+PIECE = struct.Struct("<HHB")  # quantized x, y, pocketed
+# kind, tick, tick of the keyframe it is measured from, whether STATE follows
+DELTA_HEADER = struct.Struct("<BIIB")
+STATE = struct.Struct("<hhBB")  # scores, turn, phase
+COUNT = struct.Struct("<H")
+# piece index (top bit set once pocketed), offset from the keyframe
+CHANGE = struct.Struct("<Hhh")
+POCKETED = 0x8000
+
+
+class BoardEncoder:
+    def __init__(self, keyframe_interval=60, scale=8):
+        self.keyframe_interval = keyframe_interval
+        self.scale = scale
+        self.tick = 0
+        self.key_tick = None
+        self.key_pieces = None  # (x, y, pocketed) per piece in the keyframe
+        self.key_state = None
+        self.last = None  # (x, y, pocketed) per piece as last seen, unquantized
+        self.changed = set()  # pieces that differ from the keyframe
+        self.board = None
+
+    def pieces(self, board):
+        return board.coins + [board.striker]
+
+    def quantize(self, body):
+        return (round(body.x * self.scale), round(body.y * self.scale), body.pocketed)
+
+    def state(self, board):
+        return (board.scores[0], board.scores[1], board.turn, PHASES.index(board.game_phase))
+
+    def encode(self, board):
+        """The frame for this tick, and whether it is a keyframe."""
+        pieces = self.pieces(board)
+        tick = self.tick
+        self.tick += 1
+        if (board is not self.board or self.key_tick is None
+                or tick - self.key_tick >= self.keyframe_interval):
+            return self.keyframe(board, pieces, tick), True
+
+        # Only pieces that moved since last tick can have changed; sleeping
+        # ones are skipped after a cheap comparison
+        last = self.last
+        for i, body in enumerate(pieces):
+            seen = (body.x, body.y, body.pocketed)
+            if seen != last[i]:
+                last[i] = seen
+                if self.quantize(body) != self.key_pieces[i]:
+                    self.changed.add(i)
+                else:
+                    self.changed.discard(i)
+
+        state = self.state(board)
+        parts = [DELTA_HEADER.pack(DELTA, tick, self.key_tick, state != self.key_state)]
+        if state != self.key_state:
+            parts.append(STATE.pack(*state))
+        parts.append(COUNT.pack(len(self.changed)))
+        for i in sorted(self.changed):
+            x, y, pocketed = self.quantize(pieces[i])
+            key_x, key_y, key_pocketed = self.key_pieces[i]
+            if pocketed:
+                parts.append(CHANGE.pack(i | POCKETED, 0, 0))
+            else:
+                parts.append(CHANGE.pack(i, x - key_x, y - key_y))
+        return b"".join(parts), False
+
+    def keyframe(self, board, pieces, tick):
+        self.board = board
+        self.key_tick = tick
+        self.key_pieces = [self.quantize(body) for body in pieces]
+        self.key_state = self.state(board)
+        self.last = [(body.x, body.y, body.pocketed) for body in pieces]
+        self.changed = set()
+        parts = [KEY_HEADER.pack(KEYFRAME, tick, *self.key_state, len(pieces))]
+        parts += [PIECE.pack(*piece) for piece in self.key_pieces]
+        return b"".join(parts)
+
+
+# A spectator's copy of the board, rebuilt from frames
+class BoardView:
+    def __init__(self, scale=8):
+        self.scale = scale
+        self.tick = None
+        self.key_tick = None
+        self.key_pieces = None
+        self.key_state = None
+        self.pieces = []  # (x, y, pocketed) per coin, then the striker
+        self.scores = [0, 0]
+        self.turn = 0
+        self.game_phase = PHASES[0]
+
+    def apply(self, frame):
+        """Update from one frame; False if it is a delta from a keyframe we never got."""
+        kind = frame[0]
+        if kind == KEYFRAME:
+            kind, tick, score0, score1, turn, phase, count = KEY_HEADER.unpack_from(frame)
+            self.key_tick = tick
+            self.key_state = (score0, score1, turn, phase)
+            self.key_pieces = [PIECE.unpack_from(frame, KEY_HEADER.size + i * PIECE.size)
+                               for i in range(count)]
+            pieces = list(self.key_pieces)
+            state = self.key_state
+        else:
+            kind, tick, key_tick, has_state = DELTA_HEADER.unpack_from(frame)
+            if key_tick != self.key_tick:
+                return False
+            offset = DELTA_HEADER.size
+            state = self.key_state
+            if has_state:
+                state = STATE.unpack_from(frame, offset)
+                offset += STATE.size
+            count, = COUNT.unpack_from(frame, offset)
+            offset += COUNT.size
+            pieces = list(self.key_pieces)
+            for j in range(count):
+                index, dx, dy = CHANGE.unpack_from(frame, offset + j * CHANGE.size)
+                if index & POCKETED:
+                    index &= ~POCKETED
+                    x, y, pocketed = pieces[index]
+                    pieces[index] = (x, y, True)
+                else:
+                    x, y, pocketed = self.key_pieces[index]
+                    pieces[index] = (x + dx, y + dy, False)
+
+        self.tick = tick
+        self.pieces = [(x / self.scale, y / self.scale, bool(pocketed)) for x, y, pocketed in pieces]
+        self.scores = [state[0], state[1]]
+        self.turn = state[2]
+        self.game_phase = PHASES[state[3]]
+        return True
+
+
+# One spectator's socket
+class Subscriber:
+    def __init__(self, writer):
+        self.writer = writer
+        self.task = asyncio.current_task()
+        self.key_tick = None  # keyframe this subscriber has
+        self.sent = 0
+        self.dropped = 0
+
+
+class Broadcaster:
+    def __init__(self, address="127.0.0.1", port=0, high_water=64 * 1024, keyframe_interval=60):
+        self.address = address
+        self.port = port
+        self.high_water = high_water
+        self.encoder = BoardEncoder(keyframe_interval)
+        self.subscribers = set()
+        self.server = None
+        self.keyframe = None  # (tick, data) of the latest keyframe
+        self.loop = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.subscribe, self.address, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def subscribe(self, reader, writer):
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        subscriber = Subscriber(writer)
+        self.subscribers.add(subscriber)
+        try:
+            # Spectators never send anything; this just notices them leave
+            while await reader.read(1024):
+                pass
+        except (ConnectionError, OSError):
+            pass
+        self.subscribers.discard(subscriber)
+        writer.close()
+
+    async def close(self):
+        self.server.close()
+        subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.writer.close()
+        # Closing ends each subscriber's read loop
+        await asyncio.gather(*[subscriber.task for subscriber in subscribers], return_exceptions=True)
+
+    def publish(self, board):
+        """Encode this tick and send it to every subscriber; call on the loop's thread."""
+        frame, is_keyframe = self.encoder.encode(board)
+        self.send(LENGTH.pack(len(frame)) + frame, is_keyframe, self.encoder.key_tick)
+
+    def send(self, data, is_keyframe, key_tick):
+        if is_keyframe:
+            self.keyframe = (key_tick, data)
+        for subscriber in list(self.subscribers):
+            transport = subscriber.writer.transport
+            if transport.is_closing():
+                self.subscribers.discard(subscriber)
+                continue
+            if transport.get_write_buffer_size() > self.high_water:
+                # Too far behind; skip frames rather than wait for it
+                subscriber.dropped += 1
+                continue
+            if subscriber.key_tick != key_tick and not is_keyframe:
+                # It missed the keyframe this delta is measured from
+                transport.write(self.keyframe[1])
+            subscriber.key_tick = key_tick
+            transport.write(data)
+            subscriber.sent += 1
+
+    def start_thread(self):
+        """Run the broadcaster on its own loop in a background thread."""
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+
+    def publish_threadsafe(self, board):
+        """publish() from another thread: encoded here, sent on the loop's thread."""
+        frame, is_keyframe = self.encoder.encode(board)
+        data = LENGTH.pack(len(frame)) + frame
+        self.loop.call_soon_threadsafe(self.send, data, is_keyframe, self.encoder.key_tick)
+
+
+async def read_frames(reader):
+    """Yield frames from a broadcaster's stream until it closes."""
+    while True:
+        try:
+            header = await reader.readexactly(LENGTH.size)
+            length, = LENGTH.unpack(header)
+            yield await reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+
+
+async def serve_match(port, address="127.0.0.1", rate=60, seed=0, games=1):
+    """Broadcast computer-vs-computer matches at rate ticks per second."""
+    broadcaster = Broadcaster(address, port)
+    await broadcaster.start()
+    print("broadcasting on %s:%d" % (address, broadcaster.port))
+    rng = random.Random(seed)
+    period = 1 / rate
+    late = 0
+    ticks = 0
+    publish_time = 0
+    for game in range(games):
+        board = BoardState()
+        next_tick = time.perf_counter()
+        while not board.check_winner():
+            if board.game_phase == "positioning":
+                board.take_shot(*simple_shot(board, rng))
+            board.update()
+            start = time.perf_counter()
+            broadcaster.publish(board)
+            publish_time += time.perf_counter() - start
+            ticks += 1
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay < 0:
+                late += 1
+                next_tick = time.perf_counter()
+            await asyncio.sleep(max(delay, 0))
+    print("%d ticks, %d late, %.1f us per publish to %d subscribers"
+          % (ticks, late, publish_time / ticks * 1e6, len(broadcaster.subscribers)))
+    for subscriber in broadcaster.subscribers:
+        if subscriber.dropped:
+            print("a subscriber missed %d frames" % subscriber.dropped)
+    await broadcaster.close()
+
+
+async def watch(address, port):
+    reader, writer = await asyncio.open_connection(address, port)
+    view = BoardView()
+    frames = 0
+    size = 0
+    last = None
+    async for frame in read_frames(reader):
+        frames += 1
+        size += LENGTH.size + len(frame)
+        view.apply(frame)
+        state = (view.scores, view.turn, view.game_phase)
+        if state != last:
+            print("tick %d: %d-%d, player %d, %s" % (view.tick, view.scores[0], view.scores[1],
+                                                     view.turn + 1, view.game_phase))
+            last = state
+    print("%d frames, %.1f bytes per frame" % (frames, size / max(frames, 1)))
+
+
+async def load(address, port, count, slow=1):
+    """Open count subscribers, slow of which never read; report what they got."""
+    frames = [0] * count
+    sizes = [0] * count
+    connections = []
+
+    async def reader_task(i, reader):
+        async for frame in read_frames(reader):
+            frames[i] += 1
+            sizes[i] += LENGTH.size + len(frame)
+
+    tasks = []
+    for i in range(count):
+        reader, writer = await asyncio.open_connection(address, port)
+        connections.append(writer)
+        if i >= slow:
+            tasks.append(asyncio.ensure_future(reader_task(i, reader)))
+    await asyncio.gather(*tasks)
+    readers = frames[slow:]
+    print("%d subscribers got %d-%d frames each, %.1f bytes per frame"
+          % (len(readers), min(readers), max(readers), sum(sizes) / max(sum(frames), 1)))
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] not in ("serve", "watch", "load"):
+        print("usage: carrom_broadcast.py serve [ADDRESS:]PORT | watch ADDRESS:PORT"
+              " | load ADDRESS:PORT COUNT")
+        return 2
+    address, port = parse_address(argv[1])
+    if argv[0] == "serve":
+        asyncio.run(serve_match(port, address))
+    elif argv[0] == "watch":
+        asyncio.run(watch(address, port))
+    else:
+        asyncio.run(load(address, port, int(argv[2])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
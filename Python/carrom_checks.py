@@ -0,0 +1,132 @@
+"""Determinism checks for the Carrom engine.
+
+Each check plays fixed, seeded shots and compares two ways of getting the
+same result that must agree to the bit: sleeping pieces against the full
+all-pairs pass, and recorded matches against their saved replays. A
+check returns None when they agree and a description of the first
+difference otherwise, as carrom_replay.verify_replay() does. Run the
+module to run them all, or name the ones to run:
+
+    python carrom_checks.py
+    python carrom_checks.py sleeping
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+from carrom_ai import simple_shot
+from carrom_engine import BoardState
+from carrom_events import EventPhysics
+from carrom_replay import PHYSICS, Replay, ReplayRecorder, settle, verify_replay
+
+# Give up on a shot that has not come to rest after this many frames
+MAX_SHOT_FRAMES = 5000
+
+
+def random_shot(board, rng):
+    """A seeded shot from anywhere on the mover's baseline."""
+    left, right = board.baseline_bounds()
+    return rng.uniform(left, right), rng.uniform(-math.pi, math.pi), rng.uniform(5, 30)
+
+
+def full_pass_step(board):
+    """One frame with every piece moved and every pair tested, as before pieces slept."""
+    board.striker.update(board.timestep)
+    for coin in board.coins:
+        coin.update(board.timestep)
+    board.check_collisions()
+    # Coins moved outside step(), so the cached free baseline spots are stale
+    board.wake()
+
+
+def check_sleeping(seeds=10, shots=10, grid_seeds=2, grid_shots=3):
+    """step() with sleeping pieces against the full all-pairs pass, frame by frame.
+
+    The grid boards are big enough for check_collisions() to use the grid.
+    """
+    games = [(seed, shots, {}) for seed in range(seeds)]
+    games += [(seed, grid_shots, {"black": 150, "white": 149, "coin_radius": 6})
+              for seed in range(grid_seeds)]
+    for seed, count, options in games:
+        rng = random.Random(seed)
+        board = BoardState(**options)
+        reference = BoardState(**options)
+        for number in range(1, count + 1):
+            shot = random_shot(board, rng)
+            board.take_shot(*shot)
+            reference.take_shot(*shot)
+            frames = 0
+            while not reference.is_at_rest():
+                if frames == MAX_SHOT_FRAMES:
+                    return "seed %d shot %d never came to rest" % (seed, number)
+                board.step()
+                full_pass_step(reference)
+                frames += 1
+                if board.snapshot() != reference.snapshot():
+                    return "seed %d shot %d: boards differ after frame %d" % (seed, number, frames)
+            if not board.is_at_rest():
+                return "seed %d shot %d: still moving after the full pass stopped" % (seed, number)
+            board.end_turn()
+            reference.end_turn()
+    return None
+
+
+def check_replays(seeds=2, shots=40):
+    """Record matches under each physics backend, save, load and re-play them."""
+    with tempfile.TemporaryDirectory() as directory:
+        for physics in PHYSICS:
+            for seed in range(seeds):
+                rng = random.Random(seed)
+                board = BoardState()
+                if physics == "events":
+                    board.physics = EventPhysics()
+                recorder = ReplayRecorder(board, seed)
+                for number in range(shots):
+                    if board.check_winner():
+                        break
+                    board.take_shot(*simple_shot(board, rng))
+                    if not settle(board):
+                        return "%s seed %d: shot %d never came to rest" % (physics, seed, number + 1)
+                recorded = recorder.finish(board)
+
+                path = os.path.join(directory, "%s-%d.crpl" % (physics, seed))
+                recorded.save(path)
+                replay = Replay.load(path)
+                if (replay.physics, replay.seed, replay.shots, replay.scores) != (
+                        physics, seed, recorded.shots, recorded.scores):
+                    return "%s seed %d: the loaded replay differs from the recording" % (physics, seed)
+                problem = verify_replay(replay)
+                if problem is not None:
+                    return "%s seed %d: %s" % (physics, seed, problem)
+    return None
+
+
+CHECKS = {
+    "sleeping": check_sleeping,
+    "replays": check_replays,
+}
+
+
+def main(names):
+    for name in names:
+        if name not in CHECKS:
+            print("unknown check %r; choose from %s" % (name, ", ".join(CHECKS)))
+            return 2
+    failures = 0
+    for name in names or CHECKS:
+        start = time.perf_counter()
+        problem = CHECKS[name]()
+        elapsed = time.perf_counter() - start
+        if problem is None:
+            print("%s: ok (%.1f s)" % (name, elapsed))
+        else:
+            print("%s: FAILED: %s" % (name, problem))
+            failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
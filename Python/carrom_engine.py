@@ -0,0 +1,995 @@
+"""Display-free Carrom physics and rules.
+
+Nothing in here touches pygame, so boards can be built and simulated on a
+machine with no screen, as fast as the CPU allows. Carrom.py builds its
+drawable pieces and the window on top of these classes.
+"""
+import heapq
+import math
+import struct
+from bisect import bisect_right
+from collections import deque
+from contextlib import contextmanager
+from itertools import chain
+from operator import attrgetter
+from time import perf_counter
+
+# Window size the board is laid out in (matches Carrom.py)
+WIDTH = 600
+HEIGHT = 600
+
+# Physics constants, tuned per 1/60 s frame. Speeds are always measured
+# in pixels per frame; faster physics rates take shorter steps
+FRAME_RATE = 60
+FRICTION = 0.98
+STOP_SPEED = 0.1
+WALL_RESTITUTION = 0.8
+POWER_MULTIPLIER = 1.5
+MAX_POWER = 30
+
+COIN_RADIUS = 15
+STRIKER_RADIUS = 20
+
+# Piece kinds and the points they are worth when pocketed
+QUEEN = "queen"
+BLACK = "black"
+WHITE = "white"
+STRIKER = "striker"
+POINTS = {QUEEN: 5, BLACK: 1, WHITE: 2, STRIKER: 0}
+
+WINNING_SCORE = 21
+
+# Boards with at least this many coins use the spatial-hash broadphase
+GRID_MIN_COINS = 40
+
+PHASES = ("positioning", "aiming", "waiting")
+
+_snapshot_layouts = {}
+_motion = attrgetter("x", "y", "velocity_x", "velocity_y")
+_pocketed = attrgetter("pocketed")
+
+
+def snapshot_layout(coins):
+    """Struct packing a board with this many coins, see BoardState.snapshot()."""
+    if coins not in _snapshot_layouts:
+        pieces = coins + 1
+        # x, y, velocity_x, velocity_y per piece (striker last) and the
+        # striker's angle and power; pocketed per piece and the striker's
+        # valid_position; both scores, the turn and the phase
+        _snapshot_layouts[coins] = struct.Struct("<%dd%d?2iBB" % (4 * pieces + 2, pieces + 1))
+    return _snapshot_layouts[coins]
+
+
+# A single round piece on the board
+class Body:
+    def __init__(self, x, y, radius=COIN_RADIUS, kind=BLACK):
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.kind = kind
+        self.velocity_x = 0
+        self.velocity_y = 0
+        self.friction = FRICTION
+        self.pocketed = False
+
+    @property
+    def is_queen(self):
+        return self.kind == QUEEN
+
+    def is_moving(self):
+        return self.velocity_x != 0 or self.velocity_y != 0
+
+    def update(self, timestep=1):
+        # timestep is the step length in frames
+        if not self.pocketed:
+            self.x += self.velocity_x * timestep
+            self.y += self.velocity_y * timestep
+
+            # Apply friction
+            friction = self.friction if timestep == 1 else self.friction ** timestep
+            self.velocity_x *= friction
+            self.velocity_y *= friction
+
+            # Stop if velocity is very small
+            if abs(self.velocity_x) < STOP_SPEED and abs(self.velocity_y) < STOP_SPEED:
+                self.velocity_x = 0
+                self.velocity_y = 0
+
+    def copy(self):
+        body = Body(self.x, self.y, self.radius, self.kind)
+        body.velocity_x = self.velocity_x
+        body.velocity_y = self.velocity_y
+        body.pocketed = self.pocketed
+        return body
+
+
+# The striker: a bigger piece that is placed on a baseline and shot
+class StrikerBody(Body):
+    def __init__(self, x, y):
+        super().__init__(x, y, STRIKER_RADIUS, STRIKER)
+        self.is_selected = False
+        self.power = 0
+        self.max_power = MAX_POWER
+        self.angle = 0
+        self.valid_position = True  # Flag to indicate if position is valid
+
+    def position_on_baseline(self, board, mouse_x, player_turn=0):
+        # Clamp the x position to the bounds of the player's baseline
+        left_bound, right_bound = board.baseline_bounds()
+        self.x = max(left_bound, min(mouse_x, right_bound))
+        self.y = board.baseline_y(player_turn)
+
+        # Mark overlapping positions as invalid but keep the striker under
+        # the mouse so the player still gets visual feedback
+        self.valid_position = board.free_baseline(player_turn).contains(self.x)
+
+    def aim(self, mouse_pos):
+        # Calculate angle between striker and mouse position
+        dx = mouse_pos[0] - self.x
+        dy = mouse_pos[1] - self.y
+        self.angle = math.atan2(dy, dx)
+
+        # Calculate power based on distance (capped at max_power)
+        distance = math.sqrt(dx**2 + dy**2)
+        self.power = min(distance / 15, self.max_power)
+
+    def shoot(self):
+        # Apply velocity based on power and angle with a power multiplier
+        self.velocity_x = math.cos(self.angle) * self.power * POWER_MULTIPLIER
+        self.velocity_y = math.sin(self.angle) * self.power * POWER_MULTIPLIER
+        self.power = 0
+        self.is_selected = False
+
+    def copy(self):
+        striker = StrikerBody(self.x, self.y)
+        striker.velocity_x = self.velocity_x
+        striker.velocity_y = self.velocity_y
+        striker.pocketed = self.pocketed
+        striker.power = self.power
+        striker.angle = self.angle
+        striker.valid_position = self.valid_position
+        return striker
+
+
+# Sorted, non-overlapping [left, right] stretches of a line
+class FreeIntervals:
+    def __init__(self, intervals):
+        self.lefts = [left for left, right in intervals]
+        self.rights = [right for left, right in intervals]
+        # Total length up to the end of each interval, for sample()
+        self.cumulative = []
+        total = 0
+        for left, right in intervals:
+            total += right - left
+            self.cumulative.append(total)
+
+    def __len__(self):
+        return len(self.lefts)
+
+    def __iter__(self):
+        return iter(zip(self.lefts, self.rights))
+
+    def contains(self, x):
+        i = bisect_right(self.lefts, x) - 1
+        return i >= 0 and x <= self.rights[i]
+
+    def nearest(self, x):
+        """The closest point to x in any interval, or None if there are none."""
+        if not self.lefts:
+            return None
+        i = bisect_right(self.lefts, x) - 1
+        if i >= 0 and x <= self.rights[i]:
+            return x
+        # x is in the gap between interval i and interval i + 1
+        best = None
+        if i >= 0:
+            best = self.rights[i]
+        if i + 1 < len(self.lefts) and (best is None or self.lefts[i + 1] - x < x - best):
+            best = self.lefts[i + 1]
+        return best
+
+    def sample(self, fraction):
+        """The point fraction (0 to 1) of the way through the total length."""
+        if not self.lefts:
+            return None
+        total = self.cumulative[-1]
+        if total <= 0:
+            return self.lefts[0]
+        distance = fraction * total
+        i = min(bisect_right(self.cumulative, distance), len(self.lefts) - 1)
+        before = self.cumulative[i - 1] if i else 0
+        return min(self.lefts[i] + distance - before, self.rights[i])
+
+
+# Board geometry, pieces, scores and turn order; no drawing
+class BoardState:
+    def __init__(self, width=WIDTH, height=HEIGHT, black=9, white=9, coin_radius=COIN_RADIUS):
+        self.width = width
+        self.height = height
+        self.board_size = min(width, height) - 100
+        self.board_x = (width - self.board_size) // 2
+        self.board_y = (height - self.board_size) // 2
+        self.hole_radius = self.board_size // 20
+        self.pockets = [
+            (self.board_x, self.board_y),  # Top-left
+            (self.board_x + self.board_size, self.board_y),  # Top-right
+            (self.board_x, self.board_y + self.board_size),  # Bottom-left
+            (self.board_x + self.board_size, self.board_y + self.board_size)  # Bottom-right
+        ]
+        self.coins = []
+        self.black_count = black
+        self.white_count = white
+        self.coin_radius = coin_radius
+        self.free_spots = None  # player -> FreeIntervals, see free_baseline()
+        self.striker = self.make_striker(width // 2, self.baseline_y(0))
+        self.setup_coins()
+        self.turn = 0  # 0 for player 1, 1 for player 2
+        self.scores = [0, 0]
+        self.coins_left = None  # coins not yet pocketed, None until counted
+        self.game_phase = "positioning"  # positioning, aiming, waiting
+        # Optional physics backend (see carrom_vector.VectorPhysics); None
+        # keeps the scalar per-piece physics below
+        self.physics = None
+        self.timestep = 1  # frames per physics step, see set_physics_rate()
+        self.recorder = None  # told about every shot, see carrom_replay
+        self.profiler = None  # times the physics passes, see frame_profiler
+
+    # Subclasses override these to create drawable pieces
+    def make_coin(self, x, y, kind, radius=COIN_RADIUS):
+        return Body(x, y, radius, kind)
+
+    def make_striker(self, x, y):
+        return StrikerBody(x, y)
+
+    def baseline_y(self, player_turn):
+        # Player 1 plays from the bottom, player 2 from the top
+        if player_turn == 0:
+            return self.board_y + self.board_size - 50
+        return self.board_y + 50
+
+    def baseline_bounds(self):
+        return self.board_x + 50, self.board_x + self.board_size - 50
+
+    def free_baseline(self, player_turn):
+        """Where on the player's baseline the striker can go without touching a coin.
+
+        Each coin within reach of the baseline rules out the stretch where
+        the striker would overlap it; what is left is worked out once and
+        kept until pieces move.
+        """
+        if self.free_spots is None:
+            self.free_spots = {}
+        free = self.free_spots.get(player_turn)
+        if free is None:
+            free = self.free_spots[player_turn] = FreeIntervals(self.free_baseline_intervals(player_turn))
+        return free
+
+    def free_baseline_intervals(self, player_turn):
+        left, right = self.baseline_bounds()
+        y = self.baseline_y(player_turn)
+        blocked = []
+        for coin in self.coins:
+            if not coin.pocketed:
+                reach = self.striker.radius + coin.radius
+                dy = coin.y - y
+                if abs(dy) < reach:
+                    half = math.sqrt(reach * reach - dy * dy)
+                    blocked.append((coin.x - half, coin.x + half))
+        blocked.sort()
+
+        # Coins only rule out the open stretch between their ends, so a
+        # striker exactly touching one is allowed
+        intervals = []
+        start = left
+        for blocked_left, blocked_right in blocked:
+            if blocked_left > right:
+                break
+            if blocked_left >= start:
+                intervals.append((start, blocked_left))
+            start = max(start, blocked_right)
+        if start <= right:
+            intervals.append((start, right))
+        return intervals
+
+    def setup_coins(self):
+        self.coins = []
+
+        # Center of the board
+        center_x = self.board_x + self.board_size // 2
+        center_y = self.board_y + self.board_size // 2
+
+        # Queen (red coin) at the center
+        self.coins.append(self.make_coin(center_x, center_y, QUEEN, self.coin_radius))
+
+        if (self.black_count, self.white_count, self.coin_radius) == (9, 9, COIN_RADIUS):
+            # Standard layout: black coins in a circle around the queen...
+            arrangement_radius = 40
+            for i in range(9):
+                angle = 2 * math.pi * i / 9
+                x = center_x + math.cos(angle) * arrangement_radius
+                y = center_y + math.sin(angle) * arrangement_radius
+                self.coins.append(self.make_coin(x, y, BLACK))
+
+            # ...and white coins in an outer circle, staggered
+            arrangement_radius = 70
+            for i in range(9):
+                angle = 2 * math.pi * i / 9 + math.pi / 9
+                x = center_x + math.cos(angle) * arrangement_radius
+                y = center_y + math.sin(angle) * arrangement_radius
+                self.coins.append(self.make_coin(x, y, WHITE))
+        else:
+            kinds = [BLACK] * self.black_count + [WHITE] * self.white_count
+            for kind, (x, y) in zip(kinds, self.ring_layout(len(kinds))):
+                self.coins.append(self.make_coin(x, y, kind, self.coin_radius))
+
+        # Reset striker - Player 1 starts at the bottom
+        self.striker = self.make_striker(self.width // 2, 0)
+        self.striker.position_on_baseline(self, self.width // 2, 0)
+        self.wake()
+
+    def ring_layout(self, count):
+        """Positions for count coins packed in rings around the queen."""
+        center_x = self.board_x + self.board_size // 2
+        center_y = self.board_y + self.board_size // 2
+        spacing = 2 * self.coin_radius + 1
+
+        # Keep the baselines clear so the striker can still be placed
+        max_ring_radius = self.baseline_y(0) - center_y - STRIKER_RADIUS - self.coin_radius
+
+        positions = []
+        ring = 1
+        while len(positions) < count:
+            ring_radius = ring * spacing
+            if ring_radius > max_ring_radius:
+                raise ValueError("%d coins of radius %d do not fit on the board"
+                                 % (count, self.coin_radius))
+            # About 2*pi*ring coins fit on each ring without overlapping;
+            # alternate rings are staggered by half a slot
+            capacity = int(2 * math.pi * ring)
+            offset = math.pi / capacity * (ring % 2)
+            for i in range(min(capacity, count - len(positions))):
+                angle = 2 * math.pi * i / capacity + offset
+                positions.append((center_x + math.cos(angle) * ring_radius,
+                                  center_y + math.sin(angle) * ring_radius))
+            ring += 1
+        return positions
+
+    def copy(self):
+        """Return a headless copy of this board that shares no pieces with it."""
+        board = BoardState.__new__(BoardState)
+        board.__dict__.update(self.__dict__)
+        board.coins = [coin.copy() for coin in self.coins]
+        board.striker = self.striker.copy()
+        board.scores = list(self.scores)
+        board.recorder = None
+        board.profiler = None
+        board.wake()
+        return board
+
+    def snapshot(self):
+        """Everything that changes during a game, packed into bytes.
+
+        Restoring it on this board (or any board with as many coins) with
+        restore() puts every piece, the scores, the turn and the phase back
+        exactly, so play carries on bit for bit as it would have.
+        """
+        bodies = self.coins + [self.striker]
+        striker = self.striker
+        return snapshot_layout(len(self.coins)).pack(
+            *chain.from_iterable(map(_motion, bodies)), striker.angle, striker.power,
+            *map(_pocketed, bodies), striker.valid_position,
+            self.scores[0], self.scores[1], self.turn, PHASES.index(self.game_phase))
+
+    def restore(self, snapshot):
+        """Put the board back as it was when snapshot() returned snapshot."""
+        layout = snapshot_layout(len(self.coins))
+        if len(snapshot) != layout.size:
+            raise ValueError("snapshot is of a board with a different number of coins")
+        values = layout.unpack(snapshot)
+        bodies = self.coins + [self.striker]
+        flags = 4 * len(bodies) + 2
+        for body, x, y, velocity_x, velocity_y, pocketed in zip(
+                bodies, values[0:flags:4], values[1:flags:4], values[2:flags:4],
+                values[3:flags:4], values[flags:]):
+            body.x = x
+            body.y = y
+            body.velocity_x = velocity_x
+            body.velocity_y = velocity_y
+            body.pocketed = pocketed
+        striker = self.striker
+        striker.angle, striker.power = values[flags - 2:flags]
+        striker.is_selected = False
+        (striker.valid_position, score0, score1, self.turn, phase) = values[flags + len(bodies):]
+        self.scores = [score0, score1]
+        self.game_phase = PHASES[phase]
+        self.wake()
+        if self.physics is not None:
+            self.physics.invalidate()
+
+    def set_physics_rate(self, rate):
+        """Take physics steps at rate per second instead of once per frame."""
+        self.timestep = FRAME_RATE / rate
+        if self.physics is not None:
+            self.physics.invalidate()
+
+    def wake(self):
+        """Wake every piece; call after moving coins from outside the physics."""
+        self.coins_left = None
+        self.awake_coins = None  # sorted indices of the coins awake, None for all
+        self.striker_rest = None  # (striker, x, y) while the striker sleeps
+        self.cells = None  # coin grid kept between frames while coins sleep
+        self.free_spots = None
+
+    def is_at_rest(self):
+        if self.striker.is_moving():
+            return False
+        if self.awake_coins is not None and self.physics is None:
+            # Sleeping coins never move
+            coins = self.coins
+            for i in self.awake_coins:
+                if coins[i].is_moving():
+                    return False
+            return True
+        for coin in self.coins:
+            if not coin.pocketed and coin.is_moving():
+                return False
+        return True
+
+    def step(self):
+        """Advance all pieces by one frame and resolve collisions."""
+        self.free_spots = None
+        if self.physics is not None:
+            self.wake()
+            self.physics.step(self)
+            return
+
+        awake = self.awake_coins
+        if awake is None:
+            awake = [i for i, coin in enumerate(self.coins) if not coin.pocketed]
+        self.step_awake(awake)
+
+    def step_awake(self, awake):
+        """One frame for the awake pieces only.
+
+        A piece that goes a whole frame without moving or being touched
+        falls asleep and is skipped until a collision reaches it. Pairs are
+        visited in the same order as check_collisions() visits them and a
+        woken coin's later pairs join the queue, so the result is exactly
+        that of a full pass.
+
+        Contact islands are not tracked: a single heap of pairs, in the
+        order check_collisions() uses, covers all awake pieces, which keeps
+        that order exact. The settle check still only looks at awake_coins.
+        """
+        coins = self.coins
+        striker = self.striker
+        profiler = self.profiler
+        if profiler is not None:
+            mark = perf_counter()
+        # The striker is placed and shot from outside the physics
+        striker_awake = not striker.pocketed and (
+            striker.is_moving() or self.striker_rest != (striker, striker.x, striker.y))
+        timestep = self.timestep
+        if striker_awake:
+            striker_start = (striker.x, striker.y)
+            striker.update(timestep)
+        start = {}
+        for i in awake:
+            coin = coins[i]
+            start[i] = (coin.x, coin.y)
+            coin.update(timestep)
+
+        use_grid = len(coins) >= GRID_MIN_COINS
+        if use_grid:
+            self.update_cells(awake)
+        if profiler is not None:
+            mark = profiler.lap("move", mark)
+
+        # Pairs are (i, j) with i < j, or (i, -1) for coin i and the striker,
+        # which check_collisions() visits just before coin i's own pairs. A
+        # pair can only collide if its pieces overlap now or one of them is
+        # moved by an earlier collision, so only those pairs are queued
+        awake_set = set(awake)
+        queued = set()
+        for i in awake:
+            queued.update(self.touching_pairs(i, use_grid))
+        if striker_awake:
+            queued.update(self.touching_pairs(-1, use_grid))
+        queue = sorted(queued)
+
+        woken = set()
+        while queue:
+            pair = heapq.heappop(queue)
+            i, j = pair
+            coin = coins[i]
+            if j < 0:
+                if not self.handle_collision(striker, coin):
+                    continue
+            else:
+                other = coins[j]
+                reach = coin.radius + other.radius
+                dx = other.x - coin.x
+                dy = other.y - coin.y
+                if dx * dx + dy * dy >= reach * reach or not self.handle_collision(coin, other):
+                    continue
+
+            # Wake whoever was asleep and queue the pairs still to come that
+            # the collision made touch
+            for k in (i, j):
+                if k < 0:
+                    if not striker_awake:
+                        striker_awake = True
+                        striker_start = None
+                elif k not in awake_set:
+                    awake_set.add(k)
+                    woken.add(k)
+                for new_pair in self.touching_pairs(k, use_grid):
+                    if new_pair > pair and new_pair not in queued:
+                        queued.add(new_pair)
+                        heapq.heappush(queue, new_pair)
+
+        if profiler is not None:
+            mark = profiler.lap("collisions", mark)
+
+        order = sorted(awake_set)
+        if striker_awake:
+            self.bounce_off_walls(striker)
+        for i in order:
+            self.bounce_off_walls(coins[i])
+        if profiler is not None:
+            mark = profiler.lap("walls", mark)
+        if striker_awake and self.in_pocket(striker):
+            self.pocket(striker)
+        for i in order:
+            coin = coins[i]
+            if self.in_pocket(coin):
+                self.pocket(coin)
+                if use_grid:
+                    self.remove_from_cell(i)
+        if profiler is not None:
+            profiler.lap("pockets", mark)
+
+        # Anything that moved or was touched stays awake for another frame
+        self.awake_coins = [i for i in order if not coins[i].pocketed and (
+            i in woken or coins[i].is_moving() or (coins[i].x, coins[i].y) != start[i])]
+        if striker_awake and not striker.pocketed and not striker.is_moving() and (
+                (striker.x, striker.y) == striker_start):
+            self.striker_rest = (striker, striker.x, striker.y)
+        elif striker_awake:
+            self.striker_rest = None
+
+    def touching_pairs(self, k, use_grid):
+        """Pairs with piece k (-1 for the striker) whose pieces overlap now."""
+        coins = self.coins
+        striker = self.striker
+        if k < 0:
+            piece = striker
+            partners = [m for m in range(len(coins)) if not coins[m].pocketed]
+        else:
+            piece = coins[k]
+            partners = self.contact_candidates(k, use_grid)
+            if not striker.pocketed:
+                partners.append(-1)
+
+        x = piece.x
+        y = piece.y
+        radius = piece.radius
+        pairs = []
+        for m in partners:
+            other = striker if m < 0 else coins[m]
+            reach = radius + other.radius
+            dx = other.x - x
+            dy = other.y - y
+            if dx * dx + dy * dy < reach * reach:
+                if k < 0:
+                    pairs.append((m, -1))
+                elif m < 0:
+                    pairs.append((k, -1))
+                else:
+                    pairs.append((k, m) if k < m else (m, k))
+        return pairs
+
+    def contact_candidates(self, i, use_grid):
+        """Coins that coin i could touch: all of them, or its grid neighbours."""
+        if not use_grid:
+            coins = self.coins
+            return [j for j in range(len(coins)) if j != i and not coins[j].pocketed]
+        cell_x, cell_y = self.coin_cell[i]
+        cells = self.cells
+        found = []
+        for key in ((cell_x - 1, cell_y - 1), (cell_x - 1, cell_y), (cell_x - 1, cell_y + 1),
+                    (cell_x, cell_y - 1), (cell_x, cell_y), (cell_x, cell_y + 1),
+                    (cell_x + 1, cell_y - 1), (cell_x + 1, cell_y), (cell_x + 1, cell_y + 1)):
+            members = cells.get(key)
+            if members:
+                found.extend(members)
+        found.remove(i)
+        return found
+
+    def update_cells(self, awake):
+        # Same cells as nearby_pairs(), kept up to date for awake coins only
+        coins = self.coins
+        if self.cells is None:
+            self.cell_size = 2 * max(coin.radius for coin in coins)
+            self.cells = {}
+            self.coin_cell = [None] * len(coins)
+            moved = [i for i, coin in enumerate(coins) if not coin.pocketed]
+        else:
+            moved = awake
+        cell_size = self.cell_size
+        cells = self.cells
+        for i in moved:
+            coin = coins[i]
+            key = (int(coin.x // cell_size), int(coin.y // cell_size))
+            if key != self.coin_cell[i]:
+                self.remove_from_cell(i)
+                self.coin_cell[i] = key
+                if key in cells:
+                    cells[key].append(i)
+                else:
+                    cells[key] = [i]
+
+    def remove_from_cell(self, i):
+        key = self.coin_cell[i]
+        if key is not None:
+            members = self.cells[key]
+            members.remove(i)
+            if not members:
+                del self.cells[key]
+            self.coin_cell[i] = None
+
+    def run_until_rest(self, max_steps=10000):
+        """Step until nothing moves; returns the number of steps simulated."""
+        if self.physics is not None:
+            self.wake()
+            return self.physics.run_until_rest(self, max_steps)
+
+        steps = 0
+        while steps < max_steps and not self.is_at_rest():
+            self.step()
+            steps += 1
+        return steps
+
+    def update(self):
+        # A decided game stays exactly as it was when it was decided
+        if self.check_winner():
+            return
+
+        # Pieces only move once the striker has been shot, so how long a
+        # player takes to place and aim never changes the board
+        if self.game_phase == "waiting":
+            self.step()
+
+        # If all pieces have stopped after shooting, hand over the turn
+        if self.game_phase == "waiting" and self.is_at_rest():
+            self.end_turn()
+
+    def end_turn(self):
+        self.turn = 1 - self.turn
+        self.game_phase = "positioning"
+
+        if self.striker.pocketed:
+            # Bring a new striker back onto the next player's baseline
+            self.striker = self.make_striker(self.width // 2, 0)
+            self.striker.position_on_baseline(self, self.width // 2, self.turn)
+        else:
+            self.striker.velocity_x = 0
+            self.striker.velocity_y = 0
+
+    def take_shot(self, x, angle, power):
+        """Place the striker at x on the mover's baseline and shoot it."""
+        self.striker.position_on_baseline(self, x, self.turn)
+        self.striker.angle = angle
+        self.striker.power = min(power, self.striker.max_power)
+        self.shoot()
+
+    def shoot(self):
+        """Shoot the striker as it is placed and aimed."""
+        if self.recorder is not None:
+            self.recorder.record(self)
+        self.striker.shoot()
+        self.game_phase = "waiting"
+
+    def play_shot(self, x, angle, power, max_steps=10000):
+        """Place, shoot and settle one shot for the current player.
+
+        Returns the points the shot scored. The turn is handed over
+        afterwards, exactly as in the interactive game.
+        """
+        player = self.turn
+        score_before = self.scores[player]
+        self.take_shot(x, angle, power)
+        self.run_until_rest(max_steps)
+        self.end_turn()
+        return self.scores[player] - score_before
+
+    def striker_overlaps_coins(self):
+        """Check if the striker overlaps with any coins on the board."""
+        striker = self.striker
+        if striker.pocketed:
+            return False
+
+        for coin in self.coins:
+            if not coin.pocketed:
+                reach = striker.radius + coin.radius
+                dx = striker.x - coin.x
+                dy = striker.y - coin.y
+                if dx * dx + dy * dy < reach * reach:
+                    return True
+        return False
+
+    def check_winner(self):
+        # Check if any player has reached the winning score
+        if self.scores[0] >= WINNING_SCORE:
+            return 1  # Player 1 wins
+        elif self.scores[1] >= WINNING_SCORE:
+            return 2  # Player 2 wins
+
+        # Once every coin is pocketed the higher score wins. The coins are
+        # only counted again after a pocketing or wake(), so update() and
+        # the settle loops can ask every step
+        if self.coins_left is None:
+            self.coins_left = sum(not coin.pocketed for coin in self.coins)
+        if self.coins_left:
+            return 0  # No winner yet
+
+        if self.scores[0] > self.scores[1]:
+            return 1
+        elif self.scores[1] > self.scores[0]:
+            return 2
+        return 3  # Tie
+
+    def check_collisions(self):
+        """Full pass over every piece; step() gets the same result from step_awake()."""
+        if len(self.coins) >= GRID_MIN_COINS:
+            self.collide_nearby_pairs()
+        else:
+            self.collide_all_pairs()
+        self.check_wall_collisions()
+        self.check_pocket_collisions()
+
+    def collide_all_pairs(self):
+        coins = self.coins
+        striker = self.striker
+        count = len(coins)
+
+        for i in range(count):
+            coin = coins[i]
+            if coin.pocketed:
+                continue
+
+            # Check collision with striker
+            if not striker.pocketed:
+                self.handle_collision(striker, coin)
+
+            # Check collision with other coins, skipping the square root for
+            # pairs that are clearly apart
+            for j in range(i + 1, count):
+                other = coins[j]
+                if not other.pocketed:
+                    reach = coin.radius + other.radius
+                    dx = other.x - coin.x
+                    dy = other.y - coin.y
+                    if dx * dx + dy * dy < reach * reach:
+                        self.handle_collision(coin, other)
+
+    def nearby_pairs(self):
+        """Sorted (i, j) coin index pairs that share or neighbour a grid cell."""
+        coins = self.coins
+
+        # Cells are as wide as the largest contact distance, so any two
+        # touching coins are in the same or neighbouring cells
+        cell_size = 2 * max(coin.radius for coin in coins)
+        cells = {}
+        for i, coin in enumerate(coins):
+            if not coin.pocketed:
+                key = (int(coin.x // cell_size), int(coin.y // cell_size))
+                if key in cells:
+                    cells[key].append(i)
+                else:
+                    cells[key] = [i]
+
+        # Each cell is paired with itself and four forward neighbours, so
+        # every neighbouring pair of cells is visited once
+        pairs = []
+        for (cell_x, cell_y), members in cells.items():
+            for k, i in enumerate(members):
+                for j in members[k + 1:]:
+                    pairs.append((i, j))
+            for key in ((cell_x + 1, cell_y - 1), (cell_x + 1, cell_y),
+                        (cell_x + 1, cell_y + 1), (cell_x, cell_y + 1)):
+                others = cells.get(key)
+                if others:
+                    for i in members:
+                        for j in others:
+                            pairs.append((i, j) if i < j else (j, i))
+        pairs.sort()
+        return pairs
+
+    def collide_nearby_pairs(self):
+        coins = self.coins
+        striker = self.striker
+        pairs = self.nearby_pairs()
+        pair_count = len(pairs)
+        p = 0
+
+        # Same order as collide_all_pairs: each coin meets the striker, then
+        # the higher-numbered coins near it
+        for i, coin in enumerate(coins):
+            if coin.pocketed:
+                continue
+            if not striker.pocketed:
+                self.handle_collision(striker, coin)
+            while p < pair_count and pairs[p][0] == i:
+                other = coins[pairs[p][1]]
+                reach = coin.radius + other.radius
+                dx = other.x - coin.x
+                dy = other.y - coin.y
+                if dx * dx + dy * dy < reach * reach:
+                    self.handle_collision(coin, other)
+                p += 1
+
+    def handle_collision(self, coin1, coin2):
+        # Calculate distance between centers
+        dx = coin2.x - coin1.x
+        dy = coin2.y - coin1.y
+        distance = math.sqrt(dx**2 + dy**2)
+
+        # Check if coins are colliding
+        if distance < coin1.radius + coin2.radius:
+            # Calculate collision normal
+            if distance == 0:  # Avoid division by zero
+                nx, ny = 1, 0
+            else:
+                nx, ny = dx / distance, dy / distance
+
+            # Calculate relative velocity along the normal
+            dvx = coin2.velocity_x - coin1.velocity_x
+            dvy = coin2.velocity_y - coin1.velocity_y
+            velocity_normal = dvx * nx + dvy * ny
+
+            # If coins are moving away from each other, no collision response
+            if velocity_normal > 0:
+                return
+
+            # Equal masses swap their normal velocities
+            impulse = velocity_normal
+            coin1.velocity_x += impulse * nx
+            coin1.velocity_y += impulse * ny
+            coin2.velocity_x -= impulse * nx
+            coin2.velocity_y -= impulse * ny
+
+            # Separate coins to avoid sticking
+            overlap = (coin1.radius + coin2.radius - distance) / 2
+            coin1.x -= overlap * nx
+            coin1.y -= overlap * ny
+            coin2.x += overlap * nx
+            coin2.y += overlap * ny
+            return True
+
+    def bounce_off_walls(self, body):
+        left = self.board_x
+        top = self.board_y
+        right = self.board_x + self.board_size
+        bottom = self.board_y + self.board_size
+
+        if body.x - body.radius < left:
+            body.x = left + body.radius
+            body.velocity_x = -body.velocity_x * WALL_RESTITUTION
+        elif body.x + body.radius > right:
+            body.x = right - body.radius
+            body.velocity_x = -body.velocity_x * WALL_RESTITUTION
+
+        if body.y - body.radius < top:
+            body.y = top + body.radius
+            body.velocity_y = -body.velocity_y * WALL_RESTITUTION
+        elif body.y + body.radius > bottom:
+            body.y = bottom - body.radius
+            body.velocity_y = -body.velocity_y * WALL_RESTITUTION
+
+    def check_wall_collisions(self):
+        if not self.striker.pocketed:
+            self.bounce_off_walls(self.striker)
+
+        for coin in self.coins:
+            if not coin.pocketed:
+                self.bounce_off_walls(coin)
+
+    def in_pocket(self, body):
+        hole_squared = self.hole_radius * self.hole_radius
+        for pocket_x, pocket_y in self.pockets:
+            dx = body.x - pocket_x
+            dy = body.y - pocket_y
+            if dx * dx + dy * dy < hole_squared:
+                return True
+        return False
+
+    def pocket(self, body):
+        body.pocketed = True
+        self.coins_left = None
+        body.velocity_x = 0
+        body.velocity_y = 0
+        # Award points to the player whose shot it is
+        self.scores[self.turn] += POINTS[body.kind]
+
+    def check_pocket_collisions(self):
+        if not self.striker.pocketed and self.in_pocket(self.striker):
+            self.pocket(self.striker)
+
+        for coin in self.coins:
+            if not coin.pocketed and self.in_pocket(coin):
+                self.pocket(coin)
+
+
+# Snapshots of the last few shots, for taking them back
+class ShotHistory:
+    def __init__(self, size=20):
+        self.snapshots = deque(maxlen=size)  # oldest are dropped once full
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def push(self, board):
+        self.snapshots.append(board.snapshot())
+
+    def undo(self, board):
+        """Restore the board as it was at the last push(); False if there is none."""
+        if not self.snapshots:
+            return False
+        board.restore(self.snapshots.pop())
+        return True
+
+    def clear(self):
+        self.snapshots.clear()
+
+
+# Runs a board's physics at a fixed rate, however often it is drawn
+class FixedTimestep:
+    def __init__(self, rate=FRAME_RATE, max_lag=0.25):
+        self.rate = rate
+        self.step_seconds = 1 / rate
+        # After a long stall the game slows down instead of freezing while
+        # the physics catches up
+        self.max_lag = max_lag
+        self.lag = 0.0
+        self.alpha = 0.0
+        self.previous = []
+
+    def advance(self, board, seconds):
+        """Run the physics steps due after seconds of real time; returns how many ran."""
+        if board.timestep != FRAME_RATE / self.rate:
+            board.set_physics_rate(self.rate)
+        self.lag = min(self.lag + seconds, self.max_lag)
+        steps = int(self.lag / self.step_seconds)
+        self.lag -= steps * self.step_seconds
+
+        for step in range(steps):
+            if step == steps - 1:
+                # Where moving pieces were before the last step, to draw
+                # them part of the way between the two
+                if board.awake_coins is None:
+                    bodies = board.coins
+                else:
+                    bodies = [board.coins[i] for i in board.awake_coins]
+                self.previous = [(body, body.x, body.y) for body in [board.striker] + bodies
+                                 if body.is_moving()]
+            board.update()
+        self.alpha = self.lag / self.step_seconds
+        return steps
+
+    @contextmanager
+    def interpolated(self):
+        """Temporarily move pieces to their positions between the last two steps."""
+        alpha = self.alpha
+        saved = []
+        for body, x, y in self.previous:
+            if not body.pocketed:
+                saved.append((body, body.x, body.y))
+                body.x = x + (body.x - x) * alpha
+                body.y = y + (body.y - y) * alpha
+        try:
+            yield
+        finally:
+            for body, x, y in saved:
+                body.x = x
+                body.y = y
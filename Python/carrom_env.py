@@ -0,0 +1,200 @@
+"""Gym-style environments for training Carrom shot selection.
+
+CarromEnv wraps one board. An action is (baseline x, angle, power) for
+the player to move, and step() plays the whole shot until the pieces
+stop, with the game's own rules: points for what the shot pockets, turn
+handed over, check_winner() ending the episode. Both players act through
+the same environment, so observations include whose turn it is and the
+reward is what the shot scored for the player who took it.
+
+The striker goes on the nearest spot of the baseline that is clear of
+coins, as it does when a player clicks on a blocked spot; info["x"] is
+where it went.
+
+Observations are float32 arrays: x and y (as fractions of the window)
+and a pocketed flag for every coin, then both scores and the turn.
+
+reset() restores a snapshot of the starting board taken once, instead of
+building a new board and its coins.
+
+VectorEnv runs N CarromEnvs in worker processes. Each writes its
+observation straight into a shared-memory array, so only actions, rewards
+and flags go through the pipes. An episode that ends is reset straight
+away, as in gymnasium's vector environments, and its last observation
+is in that env's info as "final_observation".
+
+    env = VectorEnv(8, seed=0)
+    observations, infos = env.reset()
+    observations, rewards, terminated, truncated, infos = env.step(actions)
+    env.close()
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from carrom_ai import process_context
+from carrom_engine import BoardState, MAX_POWER
+from carrom_events import EventPhysics
+from carrom_replay import settle
+
+PHYSICS = ("scalar", "events")
+
+
+class CarromEnv:
+    def __init__(self, physics="scalar", max_shots=500, **board_options):
+        if physics not in PHYSICS:
+            raise ValueError("physics must be one of %s" % ", ".join(PHYSICS))
+        self.board = BoardState(**board_options)
+        if physics == "events":
+            self.board.physics = EventPhysics()
+        self.max_shots = max_shots
+        self.initial = self.board.snapshot()
+        self.shots = 0
+        self.rng = np.random.default_rng()
+        left, right = self.board.baseline_bounds()
+        self.action_low = np.array([left, -np.pi, 0], dtype=np.float32)
+        self.action_high = np.array([right, np.pi, MAX_POWER], dtype=np.float32)
+        self.observation_size = 3 * len(self.board.coins) + 3
+
+    def reset(self, seed=None):
+        """Start a new game; returns (observation, info)."""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.board.restore(self.initial)
+        self.shots = 0
+        return self.observe(), {}
+
+    def step(self, action):
+        """Play one shot; returns (observation, reward, terminated, truncated, info)."""
+        board = self.board
+        x, angle, power = (float(value) for value in action)
+        player = board.turn
+        before = board.scores[player]
+        # Only spots a player could click on; with none free, x is kept
+        left, right = board.baseline_bounds()
+        free = board.free_baseline(player).nearest(min(max(x, left), right))
+        if free is not None:
+            x = free
+        board.take_shot(x, angle, min(max(power, 0.0), MAX_POWER))
+        settle(board)
+        self.shots += 1
+        reward = board.scores[player] - before
+        winner = board.check_winner()
+        info = {"player": player, "winner": winner, "x": x}
+        return self.observe(), reward, winner != 0, self.shots >= self.max_shots, info
+
+    def sample_action(self):
+        """A uniformly random action, from the generator reset(seed) seeded."""
+        return self.rng.uniform(self.action_low, self.action_high).astype(np.float32)
+
+    def observe(self, out=None):
+        """The board as an observation, written into out if given."""
+        board = self.board
+        if out is None:
+            out = np.empty(self.observation_size, dtype=np.float32)
+        coins = len(board.coins)
+        out[0:3 * coins:3] = [coin.x / board.width for coin in board.coins]
+        out[1:3 * coins:3] = [coin.y / board.height for coin in board.coins]
+        out[2:3 * coins:3] = [coin.pocketed for coin in board.coins]
+        out[3 * coins:] = (board.scores[0], board.scores[1], board.turn)
+        return out
+
+
+def worker(connection, shared_name, shape, index, options):
+    """Serve one CarromEnv for a VectorEnv until told to close."""
+    env = CarromEnv(**options)
+    shared = shared_memory.SharedMemory(name=shared_name)
+    observations = np.ndarray(shape, dtype=np.float32, buffer=shared.buf)
+    row = observations[index]
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == "reset":
+                env.reset(argument)
+                env.observe(row)
+                connection.send({})
+            elif command == "step":
+                observation, reward, terminated, truncated, info = env.step(argument)
+                if terminated or truncated:
+                    info["final_observation"] = observation
+                    env.reset()
+                env.observe(row)
+                connection.send((reward, terminated, truncated, info))
+            else:
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del row, observations
+        shared.close()
+        connection.close()
+
+
+class VectorEnv:
+    def __init__(self, count, seed=None, **options):
+        """count CarromEnvs in worker processes; options go to CarromEnv."""
+        self.count = count
+        self.seed = seed
+        probe = CarromEnv(**options)
+        self.action_low = probe.action_low
+        self.action_high = probe.action_high
+        self.observation_size = probe.observation_size
+        shape = (count, self.observation_size)
+        self.shared = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        self.observations = np.ndarray(shape, dtype=np.float32, buffer=self.shared.buf)
+
+        context = process_context()
+        self.connections = []
+        self.processes = []
+        for index in range(count):
+            parent, child = context.Pipe()
+            process = context.Process(target=worker, daemon=True,
+                                      args=(child, self.shared.name, shape, index, options))
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self.closed = False
+
+    def reset(self, seed=None):
+        """Reset every env, env i seeded with seed + i; returns (observations, infos)."""
+        seed = self.seed if seed is None else seed
+        for index, connection in enumerate(self.connections):
+            connection.send(("reset", None if seed is None else seed + index))
+        infos = [connection.recv() for connection in self.connections]
+        return self.observations.copy(), infos
+
+    def step(self, actions):
+        """One shot in every env; returns (observations, rewards, terminated, truncated, infos)."""
+        for connection, action in zip(self.connections, actions):
+            connection.send(("step", np.asarray(action, dtype=np.float64)))
+        results = [connection.recv() for connection in self.connections]
+        rewards = np.array([result[0] for result in results], dtype=np.float32)
+        terminated = np.array([result[1] for result in results])
+        truncated = np.array([result[2] for result in results])
+        return self.observations.copy(), rewards, terminated, truncated, [result[3] for result in results]
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for connection in self.connections:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+        for connection in self.connections:
+            connection.close()
+        self.observations = None
+        self.shared.close()
+        self.shared.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,322 @@
+"""Event-driven (time-of-impact) physics backend for Carrom boards.
+
+Install it with ``board.physics = EventPhysics()``. Instead of moving every
+piece a fixed distance per frame, it works out exactly when the next
+coin-coin, coin-wall or coin-pocket contact (or a piece coming to rest)
+happens and jumps straight to it. Fast strikes cannot tunnel through coins
+or sink into walls, and quiet stretches of a shot cost nothing.
+
+Friction removes the same fraction of speed from every moving piece per
+frame, so after tau frames a piece has travelled v * glide(tau) with
+
+    glide(tau) = (1 - FRICTION ** tau) / (1 - FRICTION)
+
+Because glide() is shared by all moving pieces, the gap between any two of
+them is linear in glide(tau), contact times are roots of a quadratic, and
+glide_time() turns the root back into frames. A piece gliding freely is
+exactly where the frame-stepped engine would put it at every whole frame.
+"""
+import heapq
+import math
+
+from carrom_engine import FRICTION, STOP_SPEED, WALL_RESTITUTION
+
+# Distance covered per unit of starting speed if a piece never stopped
+FULL_GLIDE = 1 / (1 - FRICTION)
+LOG_FRICTION = math.log(FRICTION)
+
+# Closing speeds below this are round-off, not a real approach
+CLOSING_EPSILON = 1e-9
+
+# Event kinds, in the order they are resolved when they tie
+STOP = 0
+WALL_X = 1
+WALL_Y = 2
+POCKET = 3
+CONTACT = 4
+
+
+def glide(frames):
+    """Distance travelled per unit of starting speed after this many frames."""
+    return (1 - FRICTION ** frames) * FULL_GLIDE
+
+
+def glide_time(distance):
+    """Frames needed to travel this far per unit of starting speed."""
+    if distance >= FULL_GLIDE:
+        return math.inf
+    return math.log(1 - distance / FULL_GLIDE) / LOG_FRICTION
+
+
+def stop_time(velocity_x, velocity_y):
+    """Frames until friction takes both velocity components under STOP_SPEED."""
+    speed = max(abs(velocity_x), abs(velocity_y))
+    if speed < STOP_SPEED:
+        return 0.0
+    return math.log(STOP_SPEED / speed) / LOG_FRICTION
+
+
+class EventPhysics:
+    def __init__(self, max_events=100000):
+        self.max_events = max_events
+        self.board = None
+        self.loaded = False
+        self.events_processed = 0
+
+    def invalidate(self):
+        """Force the pieces to be reloaded on the next step."""
+        self.loaded = False
+
+    def load(self, board):
+        bodies = [board.striker] + board.coins
+        self.board = board
+        self.bodies = bodies
+        self.time = 0.0
+        self.queue = []
+        self.sequence = 0
+        self.newly_pocketed = []
+        # max_events caps one shot (one load), not the backend's lifetime
+        self.events_processed = 0
+
+        # Each trajectory starts at (x, y) with (vx, vy) at time since[i]
+        self.x = [float(body.x) for body in bodies]
+        self.y = [float(body.y) for body in bodies]
+        self.vx = [float(body.velocity_x) for body in bodies]
+        self.vy = [float(body.velocity_y) for body in bodies]
+        self.since = [0.0] * len(bodies)
+        self.stops_at = [stop_time(vx, vy) for vx, vy in zip(self.vx, self.vy)]
+        self.radius = [body.radius for body in bodies]
+        self.pocketed = [body.pocketed for body in bodies]
+        self.version = [0] * len(bodies)
+
+        # Allowed range of each center between the walls
+        self.left = [board.board_x + r for r in self.radius]
+        self.right = [board.board_x + board.board_size - r for r in self.radius]
+        self.top = [board.board_y + r for r in self.radius]
+        self.bottom = [board.board_y + board.board_size - r for r in self.radius]
+        for i in range(len(bodies)):
+            self.x[i] = min(max(self.x[i], self.left[i]), self.right[i])
+            self.y[i] = min(max(self.y[i], self.top[i]), self.bottom[i])
+
+        self.pockets = board.pockets
+        self.hole_squared = board.hole_radius ** 2
+        self.loaded = True
+
+        for i in range(len(bodies)):
+            if self.is_moving(i):
+                self.schedule(i)
+
+    def is_moving(self, i):
+        return self.vx[i] != 0 or self.vy[i] != 0
+
+    def is_at_rest(self):
+        for i in range(len(self.bodies)):
+            if self.vx[i] != 0 or self.vy[i] != 0:
+                return False
+        return True
+
+    def state_at(self, i, time):
+        """Position and velocity of piece i at the given time."""
+        vx, vy = self.vx[i], self.vy[i]
+        if vx == 0 and vy == 0:
+            return self.x[i], self.y[i], 0.0, 0.0
+        frames = min(time, self.stops_at[i]) - self.since[i]
+        decay = FRICTION ** frames
+        travelled = (1 - decay) * FULL_GLIDE
+        return self.x[i] + vx * travelled, self.y[i] + vy * travelled, vx * decay, vy * decay
+
+    def move_to(self, i, time):
+        # Re-anchor piece i's trajectory at the given time
+        self.x[i], self.y[i], self.vx[i], self.vy[i] = self.state_at(i, time)
+        self.since[i] = time
+
+    def changed(self, i):
+        # Piece i's trajectory was replaced: drop its old events and its stop
+        self.version[i] += 1
+        self.stops_at[i] = self.time + stop_time(self.vx[i], self.vy[i])
+
+    def push(self, time, kind, i, j=-1):
+        self.sequence += 1
+        version_j = self.version[j] if j >= 0 else 0
+        heapq.heappush(self.queue, (time, kind, self.sequence, i, j, self.version[i], version_j))
+
+    def schedule(self, i):
+        """Queue the next events of piece i, whose trajectory starts now."""
+        now = self.time
+        x, y, vx, vy = self.x[i], self.y[i], self.vx[i], self.vy[i]
+        moving = vx != 0 or vy != 0
+        stops_at = self.stops_at[i] if moving else math.inf
+
+        if moving:
+            self.push(stops_at, STOP, i)
+
+            # Walls, as distance per unit speed along each axis
+            if vx < 0:
+                self.push_within(stops_at, now + glide_time((self.left[i] - x) / vx), WALL_X, i)
+            elif vx > 0:
+                self.push_within(stops_at, now + glide_time((self.right[i] - x) / vx), WALL_X, i)
+            if vy < 0:
+                self.push_within(stops_at, now + glide_time((self.top[i] - y) / vy), WALL_Y, i)
+            elif vy > 0:
+                self.push_within(stops_at, now + glide_time((self.bottom[i] - y) / vy), WALL_Y, i)
+
+            # Pockets: first time the center comes within the hole radius
+            for pocket_x, pocket_y in self.pockets:
+                reach = self.first_contact(x - pocket_x, y - pocket_y, vx, vy, self.hole_squared)
+                if reach is not None:
+                    self.push_within(stops_at, now + glide_time(reach), POCKET, i)
+
+        # Other pieces, moving or not. Pairs further apart than both can
+        # still travel before stopping are skipped without solving anything
+        radius = self.radius[i]
+        travel = math.sqrt(vx * vx + vy * vy) * glide(stops_at - now) if moving else 0.0
+        xs, ys, vxs, vys = self.x, self.y, self.vx, self.vy
+        for j in range(len(self.bodies)):
+            if j == i or self.pocketed[j]:
+                continue
+            if vxs[j] or vys[j]:
+                other_x, other_y, other_vx, other_vy = self.state_at(j, now)
+                other_stops_at = self.stops_at[j]
+                reach = travel + math.sqrt(other_vx * other_vx + other_vy * other_vy) * glide(
+                    other_stops_at - now)
+            elif moving:
+                other_x, other_y, other_vx, other_vy = xs[j], ys[j], 0.0, 0.0
+                other_stops_at = math.inf
+                reach = travel
+            else:
+                continue
+
+            contact = radius + self.radius[j]
+            dx = other_x - x
+            dy = other_y - y
+            reach += contact
+            if dx * dx + dy * dy > reach * reach:
+                continue
+            distance = self.first_contact(dx, dy, other_vx - vx, other_vy - vy, contact * contact)
+            if distance is not None:
+                self.push_within(min(stops_at, other_stops_at), now + glide_time(distance),
+                                 CONTACT, i, j)
+
+    def push_within(self, limit, time, kind, i, j=-1):
+        # Events past a stop are recomputed when that stop happens
+        if time <= limit:
+            self.push(time, kind, i, j)
+
+    def first_contact(self, dx, dy, dvx, dvy, reach_squared):
+        """Smallest glide distance at which |d + dv * g| drops to the reach."""
+        closing = dx * dvx + dy * dvy
+        if closing >= -CLOSING_EPSILON * math.sqrt(dx * dx + dy * dy):
+            return None
+        gap = dx * dx + dy * dy - reach_squared
+        if gap <= 0:
+            return 0.0
+        speed = dvx * dvx + dvy * dvy
+        discriminant = closing * closing - speed * gap
+        if discriminant < 0:
+            return None
+        return gap / (-closing + math.sqrt(discriminant))
+
+    def advance(self, duration):
+        """Resolve every event in the next duration frames."""
+        end = self.time + duration
+        queue = self.queue
+        while queue and queue[0][0] <= end:
+            time, kind, _, i, j, version_i, version_j = heapq.heappop(queue)
+            if version_i != self.version[i] or self.pocketed[i]:
+                continue
+            if j >= 0 and (version_j != self.version[j] or self.pocketed[j]):
+                continue
+            if self.events_processed >= self.max_events:
+                # Give up on pathological clusters rather than spin forever
+                for k in range(len(self.bodies)):
+                    self.move_to(k, time)
+                    self.vx[k] = self.vy[k] = 0.0
+                queue.clear()
+                break
+
+            self.events_processed += 1
+            self.time = max(self.time, time)
+            self.resolve(kind, i, j)
+
+        self.time = end
+
+    def resolve(self, kind, i, j):
+        now = self.time
+        self.move_to(i, now)
+
+        if kind == STOP:
+            self.vx[i] = self.vy[i] = 0.0
+            self.version[i] += 1
+            self.schedule(i)
+        elif kind == WALL_X:
+            self.x[i] = self.left[i] if self.vx[i] < 0 else self.right[i]
+            self.vx[i] = -self.vx[i] * WALL_RESTITUTION
+            self.changed(i)
+            self.schedule(i)
+        elif kind == WALL_Y:
+            self.y[i] = self.top[i] if self.vy[i] < 0 else self.bottom[i]
+            self.vy[i] = -self.vy[i] * WALL_RESTITUTION
+            self.changed(i)
+            self.schedule(i)
+        elif kind == POCKET:
+            self.pocketed[i] = True
+            self.vx[i] = self.vy[i] = 0.0
+            self.version[i] += 1
+            self.newly_pocketed.append(i)
+        else:
+            self.move_to(j, now)
+            dx = self.x[j] - self.x[i]
+            dy = self.y[j] - self.y[i]
+            distance = math.sqrt(dx * dx + dy * dy)
+            if distance == 0:
+                nx, ny = 1.0, 0.0
+            else:
+                nx, ny = dx / distance, dy / distance
+
+            # A grazing contact can round to "not closing"; both trajectories
+            # are then left alone so it cannot fire again at the same instant
+            velocity_normal = (self.vx[j] - self.vx[i]) * nx + (self.vy[j] - self.vy[i]) * ny
+            if velocity_normal >= -CLOSING_EPSILON:
+                return
+
+            # Equal masses swap their normal velocities
+            self.vx[i] += velocity_normal * nx
+            self.vy[i] += velocity_normal * ny
+            self.vx[j] -= velocity_normal * nx
+            self.vy[j] -= velocity_normal * ny
+            self.changed(i)
+            self.changed(j)
+            self.schedule(i)
+            self.schedule(j)
+
+    def store(self, board):
+        # Bring every piece to the current time and copy it back
+        for i, body in enumerate(self.bodies):
+            if self.is_moving(i):
+                self.move_to(i, self.time)
+            body.x = self.x[i]
+            body.y = self.y[i]
+            body.velocity_x = self.vx[i]
+            body.velocity_y = self.vy[i]
+        for i in self.newly_pocketed:
+            board.pocket(self.bodies[i])
+        self.newly_pocketed = []
+
+    def step(self, board):
+        if not self.loaded or self.board is not board:
+            self.load(board)
+        self.advance(board.timestep)
+        self.store(board)
+        if self.is_at_rest():
+            self.loaded = False
+
+    def run_until_rest(self, board, max_steps=10000):
+        self.load(board)
+        # Jump from event to event; the last stop leaves nothing queued
+        while self.queue and not self.is_at_rest():
+            self.advance(self.queue[0][0] - self.time)
+            if self.time >= max_steps:
+                break
+        self.store(board)
+        self.loaded = False
+        return math.ceil(self.time)
@@ -0,0 +1,339 @@
+"""Two-player Carrom over the network, in deterministic lockstep.
+
+Only shots cross the network. Whoever shoots sends its striker x, angle and
+power with the number of the shot; the other side plays the same shot on
+its own board. Both sides run the same deterministic physics, and the
+board only moves after a shot, so the boards stay identical without ever
+sending positions. After every shot settles, both sides send a hash of
+their board, and a mismatch is reported as a desync at that shot. The
+hashes also catch two machines whose maths libraries round differently.
+
+Messages are fixed-size structs of 9 to 29 bytes on a TCP connection
+with Nagle's algorithm turned off. The connection is served by an asyncio
+loop on a background thread, so the game loop only calls poll() once a
+frame and never waits on the network. Latency only delays the other
+player's shot, not every frame.
+
+Two local processes can play each other headless with the simple
+computer player:
+
+    python carrom_net.py host 5005
+    python carrom_net.py join 127.0.0.1:5005
+"""
+import asyncio
+import hashlib
+import queue
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+from carrom_ai import simple_shot
+from carrom_engine import BoardState
+
+MAGIC = b"CRNT"
+VERSION = 1
+
+# Every message starts with its kind, which fixes its size
+HELLO = 0
+SHOT = 1
+HASH = 2
+PING = 3
+PONG = 4
+MESSAGES = {
+    HELLO: struct.Struct("<B4sHd"),  # magic, version, physics timestep
+    SHOT: struct.Struct("<BIddd"),  # shot number, striker x, angle, power
+    HASH: struct.Struct("<BIQ"),  # shot number, board hash once it settled
+    PING: struct.Struct("<Bd"),  # sender's clock, echoed back in a PONG
+    PONG: struct.Struct("<Bd"),
+}
+
+
+def board_hash(board):
+    """64-bit hash of everything that decides how the game goes on."""
+    values = []
+    for body in board.coins + [board.striker]:
+        values += [body.x, body.y, body.velocity_x, body.velocity_y, body.pocketed]
+    data = struct.pack("<%dd3i" % len(values), *values, board.scores[0], board.scores[1], board.turn)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+# A TCP connection to the other player, served by an asyncio loop on a thread
+class Connection:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.incoming = queue.Queue()  # decoded messages; None once closed
+        self.writer = None
+        self.unsent = []  # messages sent before the connection was made
+        self.server = None
+        self.error = None
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def host(cls, port, address="127.0.0.1"):
+        """Listen for the other player; returns at once, they connect later."""
+        connection = cls()
+        asyncio.run_coroutine_threadsafe(connection.listen(address, port), connection.loop).result()
+        return connection
+
+    @classmethod
+    def join(cls, address, port, timeout=10):
+        """Connect to a hosting player, retrying until timeout seconds have passed."""
+        connection = cls()
+        asyncio.run_coroutine_threadsafe(connection.connect(address, port, timeout), connection.loop)
+        return connection
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    async def listen(self, address, port):
+        self.server = await asyncio.start_server(self.accept, address, port)
+
+    async def accept(self, reader, writer):
+        if self.writer is not None:
+            # Somebody is already playing
+            writer.close()
+            return
+        self.server.close()
+        await self.serve(reader, writer)
+
+    async def connect(self, address, port, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(address, port)
+                break
+            except OSError as error:
+                if time.monotonic() > deadline:
+                    self.error = error
+                    self.incoming.put(None)
+                    return
+                await asyncio.sleep(0.1)
+        await self.serve(reader, writer)
+
+    async def serve(self, reader, writer):
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.writer = writer
+        for data in self.unsent:
+            writer.write(data)
+        self.unsent = []
+        try:
+            while True:
+                kind = (await reader.readexactly(1))[0]
+                message = MESSAGES.get(kind)
+                if message is None:
+                    raise ConnectionError("unknown message kind %d" % kind)
+                data = bytes([kind]) + await reader.readexactly(message.size - 1)
+                if kind == PING:
+                    # Answered straight away, so pings time the network alone
+                    writer.write(MESSAGES[PONG].pack(PONG, *message.unpack(data)[1:]))
+                    continue
+                self.incoming.put(message.unpack(data))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as error:
+            if not isinstance(error, asyncio.IncompleteReadError):
+                self.error = error
+        self.writer = None
+        writer.close()
+        self.incoming.put(None)
+
+    def send(self, kind, *fields):
+        data = MESSAGES[kind].pack(kind, *fields)
+        self.loop.call_soon_threadsafe(self.write, data)
+
+    def write(self, data):
+        if self.writer is None:
+            self.unsent.append(data)
+        else:
+            self.writer.write(data)
+
+    def receive(self):
+        """Every message that has arrived since the last call; never blocks."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.incoming.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(1)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(1)
+
+    async def shutdown(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.server is not None:
+            self.server.close()
+        # Closing the stream ends the read loop; anything else still
+        # running (a join still retrying) is cancelled
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=0.5)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+# One networked match on a board, for the player hosting (0) or joining (1)
+class LockstepSession:
+    def __init__(self, board, player, connection):
+        self.board = board
+        self.player = player
+        self.connection = connection
+        # Pass shots on to any replay recorder already attached
+        self.recorder = board.recorder
+        board.recorder = self
+        self.shots = 0  # shots played so far; the next shot's number
+        self.settling = None  # number of the shot in flight
+        self.remote_shots = {}
+        self.local_hashes = {}
+        self.remote_hashes = {}
+        self.desync = None  # first shot after which the boards differed
+        self.ready = False  # the other side said hello with the same settings
+        self.closed = False
+        self.error = None
+        self.round_trip = None  # seconds, from the last ping
+        connection.send(HELLO, MAGIC, VERSION, board.timestep)
+
+    @property
+    def my_turn(self):
+        """True while the local player may place, aim and shoot."""
+        return (self.ready and not self.closed and self.settling is None
+                and self.board.turn == self.player and not self.board.check_winner())
+
+    @property
+    def finished(self):
+        """The match is over and both sides have checked the final board."""
+        final = self.shots - 1
+        return (self.board.check_winner() and self.settling is None
+                and (final < 0 or final in self.remote_hashes or self.closed))
+
+    def record(self, board):
+        # Called by board.shoot() for every shot, local or remote
+        if board.turn == self.player:
+            striker = board.striker
+            self.connection.send(SHOT, self.shots, striker.x, striker.angle, striker.power)
+        if self.recorder is not None:
+            self.recorder.record(board)
+        self.settling = self.shots
+        self.shots += 1
+
+    def ping(self):
+        self.connection.send(PING, time.perf_counter())
+
+    def poll(self):
+        """Handle what arrived and play the other player's shot when it is due."""
+        for message in self.connection.receive():
+            if message is None:
+                self.closed = True
+                self.error = self.connection.error
+                continue
+            kind = message[0]
+            if kind == HELLO:
+                magic, version, timestep = message[1:]
+                if magic != MAGIC or version != VERSION:
+                    self.error = "the other player runs an incompatible version"
+                elif timestep != self.board.timestep:
+                    self.error = "the other player runs physics at a different rate"
+                else:
+                    self.ready = True
+            elif kind == SHOT:
+                number, x, angle, power = message[1:]
+                self.remote_shots[number] = (x, angle, power)
+            elif kind == HASH:
+                number, digest = message[1:]
+                self.remote_hashes[number] = digest
+                self.check(number)
+            elif kind == PONG:
+                self.round_trip = time.perf_counter() - message[1]
+
+        board = self.board
+        if self.settling is not None and (board.game_phase != "waiting" or board.check_winner()):
+            number = self.settling
+            self.settling = None
+            self.local_hashes[number] = board_hash(board)
+            self.connection.send(HASH, number, self.local_hashes[number])
+            self.check(number)
+
+        if (self.settling is None and board.turn != self.player and board.game_phase == "positioning"
+                and not board.check_winner() and self.shots in self.remote_shots):
+            board.take_shot(*self.remote_shots.pop(self.shots))
+
+    def check(self, number):
+        local = self.local_hashes.get(number)
+        remote = self.remote_hashes.get(number)
+        if local is not None and remote is not None and local != remote:
+            if self.desync is None or number < self.desync:
+                self.desync = number
+
+    def detach(self):
+        self.board.recorder = self.recorder
+
+
+def parse_address(text, default_address="127.0.0.1"):
+    """"PORT" or "ADDRESS:PORT" as (address, port)."""
+    address, _, port = text.rpartition(":")
+    return address or default_address, int(port)
+
+
+def play_headless(session, seed=0, timeout=60):
+    """Play a match with the simple computer player; returns the session."""
+    board = session.board
+    rng = random.Random(seed)
+    deadline = time.monotonic() + timeout
+    last_ping = 0
+    while not session.finished and not session.closed and session.error is None:
+        if time.monotonic() > deadline:
+            session.error = "timed out"
+            break
+        session.poll()
+        if time.monotonic() - last_ping > 0.5:
+            session.ping()
+            last_ping = time.monotonic()
+        if session.my_turn:
+            board.take_shot(*simple_shot(board, rng))
+        if board.game_phase == "waiting" and not board.check_winner():
+            board.update()
+        else:
+            time.sleep(0.0005)
+    return session
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] not in ("host", "join"):
+        print("usage: carrom_net.py host [ADDRESS:]PORT | join ADDRESS:PORT")
+        return 2
+    address, port = parse_address(argv[1])
+    if argv[0] == "host":
+        connection, player = Connection.host(port, address), 0
+    else:
+        connection, player = Connection.join(address, port), 1
+
+    start = time.perf_counter()
+    session = play_headless(LockstepSession(BoardState(), player, connection), seed=player)
+    elapsed = time.perf_counter() - start
+    connection.close()
+
+    board = session.board
+    print("player %d: %d shots, scores %d-%d, final hash %016x, %.1f s"
+          % (player + 1, session.shots, board.scores[0], board.scores[1], board_hash(board), elapsed))
+    if session.round_trip is not None:
+        print("round trip %.2f ms" % (session.round_trip * 1000))
+    if session.error is not None:
+        print("error: %s" % session.error)
+    if session.desync is not None:
+        print("DESYNC after shot %d" % session.desync)
+    elif session.finished:
+        print("boards matched after every shot")
+    return 1 if session.desync is not None or session.error is not None else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
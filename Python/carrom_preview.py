@@ -0,0 +1,99 @@
+"""Predicted striker path for the aim preview.
+
+While a player aims, only the striker would move until it reaches its first
+coin, so the path is rolled out with the board's own physics steps
+(Body.update, the wall bounces and the pocket check) on a copy of the
+striker alone, and stops at the first coin it touches or where it pockets
+or stops.
+
+AimPreview caches trajectories by (angle, power) rounded to small steps,
+so a still mouse costs nothing, and runs a rollout for at most a small
+time budget per frame; a long one simply carries on next frame.
+Pieces never move while a player aims, so the cache only has to be
+cleared when the striker is placed again.
+"""
+import time
+from collections import OrderedDict
+
+
+# A striker path, rolled out a few steps at a time
+class Trajectory:
+    def __init__(self, board, angle, power):
+        striker = board.striker.copy()
+        striker.angle = angle
+        striker.power = min(power, striker.max_power)
+        striker.shoot()
+        self.striker = striker
+        self.points = [(striker.x, striker.y)]  # striker centre after each step
+        self.hit = None  # the first coin the striker touches, if any
+        self.pocketed = False
+        self.done = False
+        self.steps = 0
+
+    def advance(self, board, deadline, max_steps=1000):
+        """Roll on until done or perf_counter() passes deadline; returns steps run."""
+        striker = self.striker
+        coins = [coin for coin in board.coins if not coin.pocketed]
+        steps = 0
+        while not self.done:
+            striker.update(board.timestep)
+            for coin in coins:
+                reach = striker.radius + coin.radius
+                dx = coin.x - striker.x
+                dy = coin.y - striker.y
+                if dx * dx + dy * dy < reach * reach:
+                    self.hit = coin
+                    break
+            if self.hit is None:
+                board.bounce_off_walls(striker)
+                self.pocketed = board.in_pocket(striker)
+            self.points.append((striker.x, striker.y))
+            self.steps += 1
+            steps += 1
+            self.done = (self.hit is not None or self.pocketed or not striker.is_moving()
+                         or self.steps >= max_steps)
+            # Reading the clock costs about as much as a step
+            if steps % 8 == 0 and time.perf_counter() > deadline:
+                break
+        return steps
+
+
+class AimPreview:
+    def __init__(self, budget=0.001, maxsize=64, angle_step=0.005, power_step=0.25, max_steps=1000):
+        self.budget = budget  # seconds of rollout per frame
+        self.maxsize = maxsize
+        self.angle_step = angle_step
+        self.power_step = power_step
+        self.max_steps = max_steps
+        self.entries = OrderedDict()
+        self.current = None  # trajectory for the latest aim
+        self.hits = 0
+        self.misses = 0
+        self.steps = 0  # rollout steps run, cached ones are free
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, board):
+        """The trajectory for the striker's current aim, rolled on for up to budget."""
+        striker = board.striker
+        key = (round(striker.angle / self.angle_step), round(striker.power / self.power_step))
+        trajectory = self.entries.get(key)
+        if trajectory is None:
+            self.misses += 1
+            trajectory = Trajectory(board, key[0] * self.angle_step, key[1] * self.power_step)
+            self.entries[key] = trajectory
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        if not trajectory.done:
+            self.steps += trajectory.advance(board, time.perf_counter() + self.budget, self.max_steps)
+        self.current = trajectory
+        return trajectory
+
+    def clear(self):
+        """Forget every trajectory; call when the striker or coins move."""
+        self.entries.clear()
+        self.current = None
@@ -0,0 +1,225 @@
+"""Compact binary replays of Carrom matches.
+
+A match is fully determined by the board it starts from and the shots that
+were played: pieces only move after a shot, and both the scalar and the
+event-driven physics are deterministic. A replay is therefore a fixed-size
+header (board layout, physics backend and constants, the computer player's
+RNG seed and the final scores) followed by one fixed-size record per shot,
+about 30 bytes each.
+
+verify_replay() re-plays a match headless, as fast as the CPU allows, and
+checks the scores before every shot and at the end against the recording,
+under the physics backend the match was played with.
+Run this module with replay files as arguments to check them:
+
+    python carrom_replay.py replays/*.crpl
+"""
+import os
+import struct
+import sys
+import time
+
+from carrom_engine import (BoardState, WIDTH, HEIGHT, COIN_RADIUS, FRICTION, STOP_SPEED,
+                           WALL_RESTITUTION, POWER_MULTIPLIER, MAX_POWER)
+from carrom_events import EventPhysics
+
+MAGIC = b"CRPL"
+VERSION = 2
+
+# Physics backends a replay can record, by their number in the header
+PHYSICS = ("scalar", "events")
+
+# Physics the recording was played under; a replay only re-plays exactly
+# with the same values
+CONSTANTS = (FRICTION, STOP_SPEED, WALL_RESTITUTION, POWER_MULTIPLIER, MAX_POWER)
+
+# magic, version, seed, width, height, black, white, coin radius, timestep,
+# the CONSTANTS, shot count, final scores, physics backend
+HEADER = struct.Struct("<4sHQHHHHdd5dIhhB")
+# Version 1 had no backend field; those matches were all played with scalar physics
+HEADER_V1 = struct.Struct("<4sHQHHHHdd5dIhh")
+
+# player, striker x, angle, power, scores before the shot
+SHOT = struct.Struct("<Bdddhh")
+
+# Give up on a shot that has not settled after this many physics steps
+MAX_SHOT_STEPS = 100000
+
+
+class ReplayError(ValueError):
+    pass
+
+
+def physics_name(physics):
+    """The PHYSICS name of a board's physics backend."""
+    if physics is None:
+        return "scalar"
+    if isinstance(physics, EventPhysics):
+        return "events"
+    raise ReplayError("replays can only record scalar or event-driven physics")
+
+
+class Replay:
+    def __init__(self, seed=0, width=WIDTH, height=HEIGHT, black=9, white=9,
+                 coin_radius=COIN_RADIUS, timestep=1, constants=CONSTANTS, physics="scalar"):
+        if physics not in PHYSICS:
+            raise ReplayError("unknown physics backend %r" % (physics,))
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.black = black
+        self.white = white
+        self.coin_radius = coin_radius
+        self.timestep = timestep
+        self.constants = tuple(constants)
+        self.physics = physics
+        self.shots = []  # (player, x, angle, power, score 0, score 1) per shot
+        self.scores = (0, 0)  # at the end of the match
+
+    @classmethod
+    def for_board(cls, board, seed=0):
+        """An empty replay starting from a freshly set up board like this one."""
+        return cls(seed, board.width, board.height, board.black_count, board.white_count,
+                   board.coin_radius, board.timestep, physics=physics_name(board.physics))
+
+    def new_board(self):
+        """The board the recorded match started from."""
+        board = BoardState(self.width, self.height, self.black, self.white, self.coin_radius)
+        board.timestep = self.timestep
+        if self.physics == "events":
+            board.physics = EventPhysics()
+        return board
+
+    def to_bytes(self):
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.width, self.height,
+                             self.black, self.white, self.coin_radius, self.timestep,
+                             *self.constants, len(self.shots), *self.scores,
+                             PHYSICS.index(self.physics))
+        return header + b"".join(SHOT.pack(*shot) for shot in self.shots)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER_V1.size:
+            raise ReplayError("replay is truncated")
+        magic, version = struct.unpack_from("<4sH", data)
+        if magic != MAGIC:
+            raise ReplayError("not a Carrom replay")
+        if version not in (1, VERSION):
+            raise ReplayError("unsupported replay version %d" % version)
+        header = HEADER if version == VERSION else HEADER_V1
+        if len(data) < header.size:
+            raise ReplayError("replay is truncated")
+        fields = header.unpack_from(data)
+        seed, width, height, black, white, coin_radius, timestep = fields[2:9]
+        constants = fields[9:14]
+        count, score0, score1 = fields[14:17]
+        physics = "scalar"
+        if version == VERSION:
+            if fields[17] >= len(PHYSICS):
+                raise ReplayError("unknown physics backend %d" % fields[17])
+            physics = PHYSICS[fields[17]]
+        if len(data) != header.size + count * SHOT.size:
+            raise ReplayError("replay is truncated")
+
+        replay = cls(seed, width, height, black, white, coin_radius, timestep, constants, physics)
+        replay.shots = [SHOT.unpack_from(data, header.size + i * SHOT.size) for i in range(count)]
+        replay.scores = (score0, score1)
+        return replay
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+# Attached to a board as board.recorder, which tells it about every shot
+class ReplayRecorder:
+    def __init__(self, board, seed=0):
+        self.replay = Replay.for_board(board, seed)
+        board.recorder = self
+
+    def record(self, board):
+        striker = board.striker
+        self.replay.shots.append((board.turn, striker.x, striker.angle, striker.power,
+                                  board.scores[0], board.scores[1]))
+
+    def finish(self, board):
+        """Stop recording and return the replay with the board's final scores."""
+        board.recorder = None
+        self.replay.scores = tuple(board.scores)
+        return self.replay
+
+
+def settle(board, max_steps=MAX_SHOT_STEPS):
+    """Update the board like the game loop does until the shot is over.
+
+    Returns False if it had not settled after max_steps.
+    """
+    steps = 0
+    while board.game_phase == "waiting" and not board.check_winner():
+        if steps == max_steps:
+            return False
+        board.update()
+        steps += 1
+    return True
+
+
+def verify_replay(replay):
+    """Re-play a match headless; returns None if it matches, else what differs."""
+    if replay.constants != CONSTANTS:
+        return "recorded with different physics constants %r" % (replay.constants,)
+
+    board = replay.new_board()
+    for number, (player, x, angle, power, score0, score1) in enumerate(replay.shots, 1):
+        if board.check_winner():
+            return "match was already over before shot %d" % number
+        if board.turn != player:
+            return "shot %d: player %d to move, recorded player %d" % (number, board.turn + 1, player + 1)
+        if board.scores != [score0, score1]:
+            return "shot %d: scores %d-%d, recorded %d-%d" % (number, board.scores[0], board.scores[1],
+                                                               score0, score1)
+        board.take_shot(x, angle, power)
+        if not settle(board):
+            return "shot %d never came to rest" % number
+
+    if tuple(board.scores) != tuple(replay.scores):
+        return "final scores %d-%d, recorded %d-%d" % (board.scores[0], board.scores[1],
+                                                        replay.scores[0], replay.scores[1])
+    return None
+
+
+def main(paths):
+    failures = 0
+    shots = 0
+    size = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            replay = Replay.load(path)
+        except (OSError, ReplayError) as error:
+            print("%s: %s" % (path, error))
+            failures += 1
+            continue
+        problem = verify_replay(replay)
+        if problem is not None:
+            print("%s: %s" % (path, problem))
+            failures += 1
+        shots += len(replay.shots)
+        size += os.path.getsize(path)
+    elapsed = time.perf_counter() - start
+
+    if paths:
+        print("%d replays, %d shots, %.1f KB, %.1f ms per replay, %d failed"
+              % (len(paths), shots, size / 1024, elapsed * 1000 / len(paths), failures))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
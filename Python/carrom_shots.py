@@ -0,0 +1,54 @@
+"""Resolve whole Carrom shots headless.
+
+resolve_shot() plays one shot on a copy of a board with that board's own
+physics backend, so the outcome is the one the game would reach from the
+same position. The board passed in is never modified, which makes it
+cheap to try many candidate shots from one position.
+
+Passing physics=EventPhysics() covers the time between collisions in
+closed form instead of frame by frame. That is quicker but only an
+approximation of the frame-stepped game: pieces stop at fractional
+times and overlapping pieces are never pushed apart, so about one shot
+in seven ends differently, often scoring where the game would not.
+"""
+
+
+# Outcome of a resolved shot
+class ShotResult:
+    def __init__(self, board, player, pocketed, striker_pocketed, score_delta, frames):
+        self.board = board  # resting board, turn already handed over
+        self.player = player  # who played the shot (0 or 1)
+        self.pocketed = pocketed  # indices into board.coins pocketed by the shot
+        self.striker_pocketed = striker_pocketed
+        self.score_delta = score_delta
+        self.frames = frames  # frames the interactive game would have taken
+
+    def __repr__(self):
+        return "ShotResult(player=%d, pocketed=%r, score_delta=%d, frames=%d)" % (
+            self.player, self.pocketed, self.score_delta, self.frames)
+
+
+def resolve_shot(board_state, x, angle, power, physics=None):
+    """Play a shot for the player to move and return its ShotResult.
+
+    x is the striker position along the player's baseline, angle is in
+    radians and power uses the same scale as Striker.power (0 to 30).
+    The shot is played with board_state's physics backend unless another
+    one is passed as physics.
+    """
+    board = board_state.copy()
+    if physics is not None:
+        board.physics = physics
+    player = board.turn
+    was_pocketed = [coin.pocketed for coin in board.coins]
+    score_before = board.scores[player]
+
+    board.take_shot(x, angle, power)
+    frames = board.run_until_rest()
+    striker_pocketed = board.striker.pocketed
+    board.end_turn()
+
+    pocketed = [i for i, coin in enumerate(board.coins)
+                if coin.pocketed and not was_pocketed[i]]
+    return ShotResult(board, player, pocketed, striker_pocketed,
+                      board.scores[player] - score_before, frames)
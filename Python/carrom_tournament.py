@@ -0,0 +1,178 @@
+"""Headless computer-vs-computer Carrom tournaments.
+
+Plays many matches between two computer players with no display, spread
+over a process pool, and reports how each player did. Matches follow the
+same rules as the game: the board is advanced with BoardState.update()
+exactly as the game loop does, turns hand over when the pieces stop and
+check_winner() ends the match. Players swap seats every other game so
+neither always gets the first shot.
+
+    python carrom_tournament.py --games 2000 simple planner --candidates 60
+
+Players are "simple" (the random computer player of the original game),
+"planner" (ShotPlanner's Monte Carlo search, run inside each worker) and
+"batch" (the same search with every candidate simulated at once by
+carrom_batch; needs numpy).
+"""
+import argparse
+import os
+import random
+import time
+
+from carrom_ai import process_pool, simple_shot, best_shot
+from carrom_engine import BoardState
+from carrom_events import EventPhysics
+from carrom_replay import ReplayRecorder, settle
+
+PLAYERS = ("simple", "planner", "batch")
+
+
+# Everything a worker needs to play one match
+class Match:
+    def __init__(self, number, seed, players, candidates=240, samples=3, physics="scalar",
+                 max_shots=2000, replay_dir=None):
+        self.number = number
+        self.seed = seed
+        self.players = players  # names of the players for seats 0 and 1
+        self.candidates = candidates
+        self.samples = samples
+        self.physics = physics
+        self.max_shots = max_shots
+        self.replay_dir = replay_dir
+
+
+# How one match ended
+class MatchResult:
+    def __init__(self, match, winner, scores, shots, finished):
+        self.match = match
+        self.winner = winner  # as check_winner(): 1 or 2 for a seat, 3 for a tie
+        self.scores = scores  # per seat
+        self.shots = shots  # per seat
+        self.finished = finished  # False if it hit max_shots or a shot never settled
+
+
+def choose_shot(name, board, rng, match):
+    if name in ("planner", "batch"):
+        shot = best_shot(board, rng, match.candidates, match.samples, batched=name == "batch")
+        if shot is not None:
+            return shot
+    return simple_shot(board, rng)
+
+
+def play_match(match):
+    """Play one match to the end; runs in a worker process."""
+    rng = random.Random(match.seed)
+    board = BoardState()
+    if match.physics == "events":
+        board.physics = EventPhysics()
+    recorder = ReplayRecorder(board, match.seed) if match.replay_dir else None
+
+    shots = [0, 0]
+    finished = True
+    while not board.check_winner():
+        if shots[0] + shots[1] >= match.max_shots:
+            finished = False
+            break
+        player = board.turn
+        board.take_shot(*choose_shot(match.players[player], board, rng, match))
+        shots[player] += 1
+        if not settle(board):
+            finished = False
+            break
+
+    if recorder is not None:
+        name = "match-%05d-%d.crpl" % (match.number, match.seed)
+        recorder.finish(board).save(os.path.join(match.replay_dir, name))
+    return MatchResult(match, board.check_winner(), list(board.scores), shots, finished)
+
+
+def run_tournament(players, games, workers=None, seed=0, **options):
+    """Play games matches between players[0] and players[1]; returns the MatchResults.
+
+    Extra options are passed on to Match.
+    """
+    matches = []
+    for number in range(games):
+        # Swap seats every other game
+        seats = tuple(players) if number % 2 == 0 else tuple(reversed(players))
+        matches.append(Match(number, seed + number, seats, **options))
+
+    executor = process_pool(workers)
+    try:
+        chunksize = max(1, games // (4 * (workers or os.cpu_count() or 1)))
+        return list(executor.map(play_match, matches, chunksize=chunksize))
+    finally:
+        executor.shutdown()
+
+
+def summarize(players, results, elapsed):
+    """Per-player and overall statistics as printable lines."""
+    labels = ["A", "B"]
+    wins = [0, 0]
+    points = [0, 0]
+    shots = [0, 0]
+    ties = 0
+    unfinished = 0
+    first_mover_wins = 0
+    for result in results:
+        # Which contestant sat in each seat; they swap every other game
+        contestants = [0, 1] if result.match.number % 2 == 0 else [1, 0]
+        if not result.finished:
+            unfinished += 1
+        elif result.winner == 3:
+            ties += 1
+        elif result.winner:
+            wins[contestants[result.winner - 1]] += 1
+            if result.winner == 1:
+                first_mover_wins += 1
+        for seat in range(2):
+            points[contestants[seat]] += result.scores[seat]
+            shots[contestants[seat]] += result.shots[seat]
+
+    games = len(results)
+    lines = []
+    for i in range(2):
+        lines.append("%s %-8s win rate %5.1f%%  %5.2f points per shot  %6.1f shots per game"
+                     % (labels[i], players[i], 100 * wins[i] / games,
+                        points[i] / shots[i] if shots[i] else 0, shots[i] / games))
+    lines.append("%d games, %d ties, %d unfinished, first mover won %.1f%%"
+                 % (games, ties, unfinished, 100 * first_mover_wins / games))
+    lines.append("%.1f shots per game, %.2f games per second"
+                 % ((shots[0] + shots[1]) / games, games / elapsed))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("players", nargs="*",
+                        help="the two players, each one of %s (default: simple simple)"
+                        % ", ".join(PLAYERS))
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--seed", type=int, default=0, help="match n is seeded with seed + n")
+    parser.add_argument("--candidates", type=int, default=240, help="shots the planner tries")
+    parser.add_argument("--samples", type=int, default=3, help="planner samples per shot")
+    parser.add_argument("--physics", choices=("scalar", "events"), default="scalar")
+    parser.add_argument("--max-shots", type=int, default=2000,
+                        help="give up on a match after this many shots")
+    parser.add_argument("--replay-dir", default=None, help="save every match as a replay here")
+    args = parser.parse_args(argv)
+    if not args.players:
+        args.players = ["simple", "simple"]
+    if len(args.players) != 2:
+        parser.error("give exactly two players")
+    for name in args.players:
+        if name not in PLAYERS:
+            parser.error("unknown player %r, choose from %s" % (name, ", ".join(PLAYERS)))
+
+    start = time.perf_counter()
+    results = run_tournament(args.players, args.games, args.workers, args.seed,
+                             candidates=args.candidates, samples=args.samples,
+                             physics=args.physics, max_shots=args.max_shots,
+                             replay_dir=args.replay_dir)
+    for line in summarize(args.players, results, time.perf_counter() - start):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
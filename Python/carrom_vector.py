@@ -0,0 +1,250 @@
+"""NumPy structure-of-arrays physics backend for Carrom boards.
+
+Install it with ``board.physics = VectorPhysics()``. While a shot runs,
+positions, velocities, radii and pocketed flags live in NumPy arrays and
+each frame is a handful of batched array operations. The board's Coin and
+Striker objects are only refreshed from the arrays, so they stay usable
+for drawing and for the rules in BoardState.
+
+Row 0 of every array is the striker, rows 1..n are ``board.coins``.
+"""
+import numpy as np
+
+from carrom_engine import FRICTION, STOP_SPEED, WALL_RESTITUTION
+
+# Below this many coins the all-pairs arrays beat building the grid
+GRID_MIN_COINS = 200
+
+# Upper-triangle pair indices, cached by piece count
+_pair_cache = {}
+_no_rows = np.zeros(0, dtype=np.intp)
+
+
+def pair_indices(count):
+    if count not in _pair_cache:
+        _pair_cache[count] = np.triu_indices(count, 1)
+    return _pair_cache[count]
+
+
+class VectorPhysics:
+    def __init__(self):
+        self.board = None
+        self.bodies = []
+        self.loaded = False
+
+    def invalidate(self):
+        """Force the arrays to be reloaded from the pieces on the next step."""
+        self.loaded = False
+
+    def load(self, board):
+        bodies = [board.striker] + board.coins
+        self.board = board
+        self.bodies = bodies
+
+        # Rows 0 and 1 hold the x and y components; self.x, self.y and the
+        # velocity_x/velocity_y names are views onto them
+        self.position = np.array([[body.x for body in bodies],
+                                  [body.y for body in bodies]], dtype=float)
+        self.velocity = np.array([[body.velocity_x for body in bodies],
+                                  [body.velocity_y for body in bodies]], dtype=float)
+        self.x, self.y = self.position
+        self.velocity_x, self.velocity_y = self.velocity
+        self.radius = np.array([body.radius for body in bodies], dtype=float)
+        self.pocketed = np.array([body.pocketed for body in bodies], dtype=bool)
+        self.timestep = board.timestep
+        self.friction = FRICTION ** board.timestep
+
+        # Small boards test every pair; big ones hash pieces into a grid of
+        # cells as wide as the largest contact distance
+        self.use_grid = len(board.coins) >= GRID_MIN_COINS
+        if self.use_grid:
+            self.cell_size = 2 * float(self.radius.max())
+            # A spare column stops the x + 1 neighbour wrapping to the next row
+            self.columns = int((board.board_x + board.board_size) // self.cell_size) + 2
+        else:
+            self.first, self.second = pair_indices(len(bodies))
+            self.reach = self.radius[self.first] + self.radius[self.second]
+            self.reach_squared = self.reach * self.reach
+
+        # Allowed range of each piece's center between the walls
+        self.low = np.array([board.board_x + self.radius, board.board_y + self.radius])
+        self.high = np.array([board.board_x + board.board_size - self.radius,
+                              board.board_y + board.board_size - self.radius])
+
+        # Pockets sit on the board corners, so the nearest one is found from
+        # the distance to the nearest edge on each axis
+        self.board_low = np.array([[board.board_x], [board.board_y]], dtype=float)
+        self.board_high = self.board_low + board.board_size
+        self.hole_squared = float(board.hole_radius) ** 2
+        self.loaded = True
+
+    def store(self):
+        # Copy the array state back onto the pieces
+        xs = self.x.tolist()
+        ys = self.y.tolist()
+        vxs = self.velocity_x.tolist()
+        vys = self.velocity_y.tolist()
+        for i, body in enumerate(self.bodies):
+            body.x = xs[i]
+            body.y = ys[i]
+            body.velocity_x = vxs[i]
+            body.velocity_y = vys[i]
+
+    def is_at_rest(self):
+        return not self.velocity.any()
+
+    def step_arrays(self):
+        """Advance the arrays by one frame; returns rows pocketed in it."""
+        velocity = self.velocity
+
+        # Integrate and apply friction; pocketed pieces have zero velocity
+        if self.timestep == 1:
+            self.position += velocity
+        else:
+            self.position += velocity * self.timestep
+        velocity *= self.friction
+        stopped = (np.abs(velocity) < STOP_SPEED).all(axis=0)
+        velocity[:, stopped] = 0.0
+
+        self.resolve_contacts()
+        self.bounce_off_walls()
+        return self.capture_pocketed()
+
+    def nearby_pairs(self):
+        """Index arrays of piece pairs that share or neighbour a grid cell."""
+        active = np.flatnonzero(~self.pocketed)
+        cell_x = (self.x[active] // self.cell_size).astype(np.intp)
+        cell_y = (self.y[active] // self.cell_size).astype(np.intp)
+        keys = cell_y * self.columns + cell_x
+
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        members = active[order]
+        places = np.arange(len(keys))
+
+        # Pair each piece with the rest of its own cell, then with the
+        # east, south-west, south and south-east cells
+        ranges = [(places + 1, np.searchsorted(keys, keys, side="right"))]
+        for offset in (1, self.columns - 1, self.columns, self.columns + 1):
+            ranges.append((np.searchsorted(keys, keys + offset, side="left"),
+                           np.searchsorted(keys, keys + offset, side="right")))
+
+        firsts = []
+        seconds = []
+        for starts, ends in ranges:
+            counts = ends - starts
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # Expand each [start, end) range into explicit partner places
+            offsets = np.repeat(np.cumsum(counts) - counts - starts, counts)
+            firsts.append(members[np.repeat(places, counts)])
+            seconds.append(members[np.arange(total) - offsets])
+        if not firsts:
+            return _no_rows, _no_rows
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def resolve_contacts(self):
+        x, y = self.x, self.y
+        vx, vy = self.velocity_x, self.velocity_y
+        if self.use_grid:
+            first, second = self.nearby_pairs()
+            reach = self.radius[first] + self.radius[second]
+            reach_squared = reach * reach
+        else:
+            first, second = self.first, self.second
+            reach, reach_squared = self.reach, self.reach_squared
+
+        # Narrow the pair list down to overlapping, unpocketed pairs
+        dx = x[second] - x[first]
+        dy = y[second] - y[first]
+        distance_squared = dx * dx + dy * dy
+        hit = distance_squared < reach_squared
+        if not hit.any():
+            return
+        hit &= ~(self.pocketed[first] | self.pocketed[second])
+        rows = np.flatnonzero(hit)
+        if rows.size == 0:
+            return
+
+        a = first[rows]
+        b = second[rows]
+        dx = dx[rows]
+        dy = dy[rows]
+        distance = np.sqrt(distance_squared[rows])
+
+        # Collision normals, falling back to +x for coincident centers
+        apart = distance > 0
+        safe_distance = np.where(apart, distance, 1.0)
+        nx = np.where(apart, dx / safe_distance, 1.0)
+        ny = np.where(apart, dy / safe_distance, 0.0)
+
+        # Pairs already separating get no response at all
+        velocity_normal = (vx[b] - vx[a]) * nx + (vy[b] - vy[a]) * ny
+        closing = velocity_normal <= 0
+        if not closing.all():
+            a, b = a[closing], b[closing]
+            nx, ny = nx[closing], ny[closing]
+            distance = distance[closing]
+            velocity_normal = velocity_normal[closing]
+            rows = rows[closing]
+
+        # Equal masses swap their normal velocities; contacts that share a
+        # piece are applied together
+        count = len(x)
+        impulse_x = velocity_normal * nx
+        impulse_y = velocity_normal * ny
+        vx += np.bincount(a, impulse_x, count) - np.bincount(b, impulse_x, count)
+        vy += np.bincount(a, impulse_y, count) - np.bincount(b, impulse_y, count)
+
+        # Push overlapping pieces apart to avoid sticking
+        overlap = (reach[rows] - distance) / 2
+        push_x = overlap * nx
+        push_y = overlap * ny
+        x += np.bincount(b, push_x, count) - np.bincount(a, push_x, count)
+        y += np.bincount(b, push_y, count) - np.bincount(a, push_y, count)
+
+    def bounce_off_walls(self):
+        # Pocketed pieces were clamped before they dropped, so they never
+        # register as hits here
+        clamped = np.clip(self.position, self.low, self.high)
+        hit = clamped != self.position
+        if hit.any():
+            self.position[...] = clamped
+            self.velocity[hit] *= -WALL_RESTITUTION
+
+    def capture_pocketed(self):
+        gap = np.minimum(self.position - self.board_low, self.board_high - self.position)
+        inside = (gap * gap).sum(axis=0) < self.hole_squared
+        if not inside.any():
+            return _no_rows
+        rows = np.flatnonzero(inside & ~self.pocketed)
+        if rows.size:
+            self.pocketed[rows] = True
+            self.velocity[:, rows] = 0.0
+        return rows
+
+    def step(self, board):
+        if not self.loaded or self.board is not board:
+            self.load(board)
+        pocketed = self.step_arrays()
+        self.store()
+        for row in pocketed.tolist():
+            board.pocket(self.bodies[row])
+
+        # Pick up any changes made between shots (new striker, shot power)
+        if self.is_at_rest():
+            self.loaded = False
+
+    def run_until_rest(self, board, max_steps=10000):
+        self.load(board)
+        pocketed = []
+        steps = 0
+        while steps < max_steps and not self.is_at_rest():
+            pocketed.extend(self.step_arrays().tolist())
+            steps += 1
+        self.store()
+        for row in pocketed:
+            board.pocket(self.bodies[row])
+        self.loaded = False
+        return steps
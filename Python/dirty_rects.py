@@ -0,0 +1,70 @@
+"""Dirty-rectangle presenting for the pygame games.
+
+DirtyRects remembers where each item (a coin, the bird, a line of text)
+was drawn and what it looked like. Items report themselves every frame
+through changed(); only the areas of items that moved, changed or vanished
+are passed to pygame.display.update(), instead of pushing the whole window
+with a flip.
+
+It is opt-in: both games turn it on with the --dirty-rects command line
+flag. When it is off, or after invalidate(), present() flips the whole
+window as before.
+"""
+import pygame
+
+
+class DirtyRects:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.full = True
+        self.shown = {}  # key -> (rect, state) as presented last frame
+        self.seen = {}  # key -> (rect, state) drawn this frame
+        self.rects = []
+
+    def invalidate(self):
+        """Present the whole window next time, e.g. after a screen change."""
+        self.full = True
+
+    @property
+    def partial(self):
+        return self.enabled and not self.full
+
+    def changed(self, key, rect, state=None):
+        """Record that item key is drawn at rect; True if it differs from last frame."""
+        rect = pygame.Rect(rect)
+        self.seen[key] = (rect, state)
+        previous = self.shown.get(key)
+        if previous == (rect, state):
+            return False
+        if previous is not None:
+            self.rects.append(previous[0])
+        self.rects.append(rect)
+        return True
+
+    def add(self, rect):
+        """Present rect this frame, for drawing that is not tracked as an item."""
+        self.rects.append(rect)
+
+    def collect(self):
+        """Add the areas of items that were not drawn again; returns all dirty rects."""
+        for key, (rect, state) in self.shown.items():
+            if key not in self.seen:
+                self.rects.append(rect)
+                self.seen[key] = None
+        return self.rects
+
+    def previous_rects(self):
+        """Everywhere an item was drawn last frame."""
+        return [rect for rect, state in self.shown.values()]
+
+    def present(self):
+        if self.partial:
+            rects = self.collect()
+            if rects:
+                pygame.display.update(rects)
+        else:
+            pygame.display.flip()
+        self.shown = {key: item for key, item in self.seen.items() if item is not None}
+        self.seen = {}
+        self.rects = []
+        self.full = False
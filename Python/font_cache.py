@@ -0,0 +1,77 @@
+"""Font files found by name, remembered on disk between runs.
+
+The first pygame.font.SysFont() call has pygame enumerate every installed
+font (fc-list on Linux, the registry on Windows, system_profiler on macOS),
+which can take longer than the rest of a game's start-up. The games only
+ask for a name or two, so FontCache keeps the file each name resolved to
+in a small JSON file, and later starts go straight to
+pygame.font.Font(path) without enumerating anything.
+
+A cached file that has since gone away is looked up again. A name nothing
+matched is remembered as null and gets pygame's default font, as SysFont()
+would give; delete the cache file to look again after installing fonts.
+
+    font = load_font("arial", 32)
+"""
+import json
+import os
+
+import pygame
+
+
+def default_cache_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "coding-games", "fonts.json")
+
+
+class FontCache:
+    def __init__(self, path=None):
+        self.path = path or default_cache_path()
+        self.paths = None  # "name:bold:italic" -> font file, None when nothing matched
+        self.lookups = 0  # names that had to be resolved by enumerating fonts
+
+    def load(self):
+        """Read the saved paths; a missing or unreadable file starts empty."""
+        try:
+            with open(self.path) as file:
+                paths = json.load(file)
+        except (OSError, ValueError):
+            paths = {}
+        self.paths = paths if isinstance(paths, dict) else {}
+
+    def save(self):
+        # Only a cache: a read-only home directory costs the next start a lookup
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.path, "w") as file:
+                json.dump(self.paths, file, indent=1, sort_keys=True)
+        except OSError:
+            pass
+
+    def find(self, name, bold=False, italic=False):
+        """Path of the font file for name, or None for pygame's default font."""
+        if self.paths is None:
+            self.load()
+        key = "%s:%d:%d" % (name.lower(), bold, italic)
+        if key in self.paths:
+            path = self.paths[key]
+            if path is None or os.path.exists(path):
+                return path
+        path = pygame.font.match_font(name, bold, italic)
+        self.lookups += 1
+        self.paths[key] = path
+        self.save()
+        return path
+
+    def font(self, name, size, bold=False, italic=False):
+        return pygame.font.Font(self.find(name, bold, italic), size)
+
+
+font_cache = FontCache()
+
+
+def load_font(name, size, bold=False, italic=False):
+    """Like pygame.font.SysFont(name, size), through the shared on-disk cache."""
+    return font_cache.font(name, size, bold, italic)
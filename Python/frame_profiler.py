@@ -0,0 +1,102 @@
+"""Per-phase frame timing for the pygame games.
+
+FrameProfiler keeps how long each phase of the main loop (physics, input,
+drawing, presenting...) took over the last N frames in a fixed-size ring
+buffer, and reports the 50th, 95th and 99th percentile of each, so a slow
+phase stands out while playing. save() writes the buffered frames as CSV
+or JSON, depending on the file extension.
+
+Phases are timed with time.perf_counter():
+
+    profiler.begin_frame()
+    with profiler.phase("draw"):
+        board.draw(window)
+    profiler.end_frame()
+"""
+import json
+import time
+from array import array
+from contextlib import contextmanager
+
+PERCENTILES = (50, 95, 99)
+
+
+class FrameProfiler:
+    def __init__(self, size=600):
+        self.size = size
+        self.samples = {}  # phase -> ring of seconds per frame, "frame" first
+        self.index = 0  # where the next frame goes
+        self.count = 0  # frames in the ring
+        self.current = {}
+        self.frame_start = None
+        self.add("frame", 0)
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.current = {}
+
+    def add(self, name, seconds):
+        """Count seconds towards phase name in this frame."""
+        if name not in self.samples:
+            self.samples[name] = array("d", bytes(8 * self.size))
+        self.current[name] = self.current.get(name, 0) + seconds
+
+    def lap(self, name, since):
+        """Count the time since perf_counter() read since; returns the time now."""
+        now = time.perf_counter()
+        self.add(name, now - since)
+        return now
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def end_frame(self):
+        """Store this frame in the ring; phases that did not run took no time."""
+        if self.frame_start is not None:
+            self.add("frame", time.perf_counter() - self.frame_start)
+        for name, ring in self.samples.items():
+            ring[self.index] = self.current.get(name, 0)
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        self.current = {}
+        self.frame_start = None
+
+    def history(self, name):
+        """Seconds phase name took in each buffered frame, oldest first."""
+        ring = self.samples[name]
+        if self.count < self.size:
+            return list(ring[:self.count])
+        return list(ring[self.index:]) + list(ring[:self.index])
+
+    def percentiles(self, name, points=PERCENTILES):
+        values = sorted(self.history(name))
+        if not values:
+            return [0.0 for point in points]
+        return [values[min(len(values) - 1, len(values) * point // 100)] for point in points]
+
+    def report(self):
+        """(phase, p50, p95, p99) in milliseconds for every phase seen."""
+        return [(name,) + tuple(value * 1000 for value in self.percentiles(name))
+                for name in self.samples]
+
+    def save(self, path):
+        """Write the buffered frames in milliseconds to a .json or .csv file."""
+        names = list(self.samples)
+        columns = [[value * 1000 for value in self.history(name)] for name in names]
+        with open(path, "w", newline="") as file:
+            if path.endswith(".json"):
+                json.dump({
+                    "frames": self.count,
+                    "percentiles": {name: dict(zip(["p%d" % point for point in PERCENTILES], row))
+                                    for name, *row in self.report()},
+                    "milliseconds": dict(zip(names, columns)),
+                }, file, indent=1)
+            else:
+                file.write(",".join(names) + "\n")
+                for row in zip(*columns):
+                    file.write(",".join("%.4f" % value for value in row) + "\n")
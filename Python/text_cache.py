@@ -0,0 +1,51 @@
+"""LRU cache of rendered text surfaces, shared by the pygame games.
+
+Scores, labels and menu text are mostly the same from one frame to the
+next, so render_text() keeps the surface font.render() produced for each
+(font, text, color, antialias) and hands it back until the string changes.
+Callers only blit the surfaces; they must not draw on them.
+"""
+from collections import OrderedDict
+
+
+class TextCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, tuple(color), antialias)
+        surface = self.entries.get(key)
+        if surface is None:
+            self.misses += 1
+            surface = font.render(text, antialias, color)
+            self.entries[key] = surface
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+text_cache = TextCache()
+
+
+def render_text(font, text, color, antialias=True):
+    """font.render(text, antialias, color) through the shared cache."""
+    return text_cache.render(font, text, color, antialias)